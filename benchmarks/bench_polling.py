@@ -0,0 +1,254 @@
+# N 户号轮询性能测试
+# 在本地启动模拟接口, 使用真实的 EnergyAPI / MdejAPI / 协调器 / 传感器更新逻辑, 测量每个更新周期的开销
+#
+# 模拟接口与被测代码运行在同一个事件循环中, 事件循环延迟包含模拟接口自身的开销, 结果偏保守
+# 需要安装 homeassistant
+# 用法: python benchmarks/bench_polling.py --accounts 10 100 1000 --cycles 3
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from homeassistant.core import HomeAssistant  # noqa: E402
+
+from custom_components.impc_energy.const import BASE_APP_API_URL, BASE_ENERGY_API_URL, HOST_RATE_LIMITS  # noqa: E402
+from custom_components.impc_energy.coordinator import ImpcDataUpdateCoordinator  # noqa: E402
+from custom_components.impc_energy.energy_api import EnergyAPI  # noqa: E402
+from custom_components.impc_energy.mdej_api import MdejAPI, create_session  # noqa: E402
+from custom_components.impc_energy.rate_limit import HostRateLimiter  # noqa: E402
+from custom_components.impc_energy.sensor import get_sensors  # noqa: E402
+from custom_components.impc_energy.store import DailyStore, HistoryStore  # noqa: E402
+from custom_components.impc_energy.token_manager import MdejTokenManager  # noqa: E402
+from custom_components.impc_energy.transport import AiohttpTransport  # noqa: E402
+
+from stub_server import StubServer  # noqa: E402
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LoopLagMonitor(object):
+    """
+    事件循环延迟
+    每隔 interval 秒休眠一次, 实际醒来的时间晚于预期的部分即为延迟
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self._interval = interval
+        self._task = None
+        self.samples: List[float] = []
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self._interval)
+            self.samples.append(max(loop.time() - start - self._interval, 0.0))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def percentile(self, p: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+async def _async_create_hass(config_dir: str) -> HomeAssistant:
+    """
+    创建不启动任何集成的 hass 实例, 只用于 Store 与协调器
+    """
+    try:
+        hass = HomeAssistant(config_dir)
+    except TypeError:
+        # 旧版本没有 config_dir 参数
+        hass = HomeAssistant()
+        hass.config.config_dir = config_dir
+
+    try:
+        from homeassistant.helpers import frame
+        frame.async_setup(hass)
+    except (ImportError, AttributeError):
+        pass
+    return hass
+
+
+async def _async_setup_account(hass: HomeAssistant, index: int, session, limiter: HostRateLimiter,
+                               transport: AiohttpTransport, with_mdej: bool):
+    """
+    与 sensor.async_setup_entry 相同的方式创建一个户号的协调器与传感器
+    不使用调度器, 每个周期都请求所有数据源, 即最坏情况
+    """
+    account_number = "05%011d" % index
+
+    history_store = HistoryStore(hass, account_number)
+    await history_store.async_load()
+    energy_api = EnergyAPI(session, account_number, limiter=limiter, history_store=history_store,
+                           transport=transport)
+    energy_api.set_account_name(f"户号{index}")
+
+    mdej_api = None
+    token_manager = None
+    daily_store = None
+    if with_mdej:
+        mdej_api = MdejAPI(f"user{index}", session, limiter=limiter, transport=transport)
+        await mdej_api.initialize(token="stub-token")
+        token_manager = MdejTokenManager(mdej_api, "stub-payload")
+        daily_store = DailyStore(hass, account_number)
+        await daily_store.async_load()
+
+    coordinator = ImpcDataUpdateCoordinator(hass, energy_api, mdej_api, token_manager, daily_store)
+    sensors = await get_sensors(coordinator)
+
+    # 传感器未添加到 hass, 只执行处理数据的部分, 不写入状态
+    def _update_sensors():
+        for sensor in sensors:
+            refresh = getattr(sensor, "_refresh_from_coordinator", None)
+            if refresh is not None:
+                refresh()
+
+    unsub = coordinator.async_add_listener(_update_sensors)
+    return coordinator, unsub
+
+
+async def async_run_scale(accounts: int, cycles: int, args) -> List[dict]:
+    """
+    测试 accounts 个户号, 执行 cycles 个更新周期
+    """
+    stub = StubServer(latency=args.latency, jitter=args.jitter)
+    await stub.start()
+
+    config_dir = tempfile.mkdtemp(prefix="impc_bench_")
+    hass = await _async_create_hass(config_dir)
+
+    session = create_session(limit=args.connections, limit_per_host=args.connections)
+    transport = AiohttpTransport(session, url_rewrites={
+        BASE_ENERGY_API_URL: stub.base_url,
+        BASE_APP_API_URL: stub.base_url,
+    })
+    if args.production_limits:
+        limiter = HostRateLimiter()
+    else:
+        limit = (args.rate, args.rate, args.max_in_flight)
+        limiter = HostRateLimiter(limits={host: limit for host in HOST_RATE_LIMITS}, default=limit)
+
+    setups = [
+        await _async_setup_account(hass, index, session, limiter, transport, not args.no_mdej)
+        for index in range(accounts)
+    ]
+    coordinators = [coordinator for coordinator, _ in setups]
+
+    monitor = LoopLagMonitor(args.lag_interval)
+    results = []
+    for cycle in range(1, cycles + 1):
+        requests_before = stub.request_count
+        if not args.no_memory:
+            tracemalloc.reset_peak()
+        monitor.start()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(coordinator.async_refresh() for coordinator in coordinators))
+        wall = time.perf_counter() - start
+
+        await monitor.stop()
+        requests = stub.request_count - requests_before
+        result = {
+            "accounts": accounts,
+            "cycle": cycle,
+            "wall_s": wall,
+            "requests": requests,
+            "rps": requests / wall if wall else 0.0,
+            "failed": sum(1 for coordinator in coordinators if not coordinator.last_update_success),
+            "peak_mib": tracemalloc.get_traced_memory()[1] / 1024 / 1024 if not args.no_memory else None,
+            "lag_p50_ms": monitor.percentile(0.5) * 1000,
+            "lag_p99_ms": monitor.percentile(0.99) * 1000,
+            "lag_max_ms": max(monitor.samples, default=0.0) * 1000,
+        }
+        results.append(result)
+        _print_result(result)
+
+    for _, unsub in setups:
+        unsub()
+    await session.close()
+    await hass.async_stop(force=True)
+    await stub.stop()
+    return results
+
+
+def _print_header():
+    print("%8s %6s %9s %9s %10s %7s %10s %10s %10s %10s" % (
+        "accounts", "cycle", "wall(s)", "requests", "req/s", "failed",
+        "peak(MiB)", "lag p50", "lag p99", "lag max"))
+
+
+def _print_result(result: dict):
+    peak = "%.1f" % result["peak_mib"] if result["peak_mib"] is not None else "-"
+    print("%8d %6d %9.3f %9d %10.1f %7d %10s %8.1fms %8.1fms %8.1fms" % (
+        result["accounts"], result["cycle"], result["wall_s"], result["requests"], result["rps"],
+        result["failed"], peak, result["lag_p50_ms"], result["lag_p99_ms"], result["lag_max_ms"]))
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="N 户号轮询性能测试")
+    parser.add_argument("--accounts", type=int, nargs="+", default=[10, 100, 1000], help="户号数量, 可指定多个")
+    parser.add_argument("--cycles", type=int, default=3, help="每个规模执行的更新周期数, 第一个周期为冷启动")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟接口的固定延迟 (秒)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="模拟接口的随机延迟上限 (秒)")
+    parser.add_argument("--connections", type=int, default=100, help="连接池大小")
+    parser.add_argument("--rate", type=float, default=1000.0, help="每个主机每秒请求数")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="每个主机最大并发请求数")
+    parser.add_argument("--production-limits", action="store_true", help="使用 const.py 中的线上限速参数")
+    parser.add_argument("--no-mdej", action="store_true", help="不测试蒙电e家每日数据")
+    parser.add_argument("--no-memory", action="store_true", help="不统计内存 (tracemalloc 会明显增加耗时)")
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="事件循环延迟的采样间隔 (秒)")
+    parser.add_argument("--json", dest="json_path", help="将结果写入 JSON 文件")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+async def async_main(args) -> List[dict]:
+    if not args.no_memory:
+        tracemalloc.start()
+
+    _print_header()
+    results = []
+    for accounts in args.accounts:
+        results.extend(await async_run_scale(accounts, args.cycles, args))
+
+    warm = [result for result in results if result["cycle"] > 1]
+    if warm:
+        print("\n非冷启动周期平均耗时: %.3fs" % statistics.mean(result["wall_s"] for result in warm))
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level)
+
+    results = asyncio.run(async_main(args))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
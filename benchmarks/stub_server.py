@@ -0,0 +1,116 @@
+# 本地模拟的公众号 (yxwx) 与蒙电e家 (mdej) 接口
+# 响应格式与 energy_api.py / mdej_api.py 文档中的示例一致
+
+import asyncio
+import datetime
+import random
+
+from aiohttp import web
+
+tz = datetime.timezone(datetime.timedelta(hours=+8))
+
+DF = [85.9, 91.94, 80.78, 110.08, 82.64, 84.5, 118.12, 97.52, 103.57, 89.62, 96.59, 136.71, 0]
+DL = [203, 216, 192, 255, 196, 200, 268, 228, 241, 211, 226, 294, 0]
+
+
+class StubServer(object):
+    """
+    模拟接口服务
+    :param latency: 每个请求的固定延迟 (秒)
+    :param jitter: 额外的随机延迟上限 (秒)
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self._latency = latency
+        self._jitter = jitter
+        self.request_count = 0
+        self._runner = None
+        self.port = None
+
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.router.add_get("/api/hlwyy/business-jffw/dldf/dldfList", self._dldf_list)
+        self.app.router.add_get("/api/hlwyy/business-jffw/dldf/zztList", self._zzt_list)
+        self.app.router.add_get("/api/hlwyy/business-jffw/znjf/queryDfInfoNew", self._query_df_info_new)
+        self.app.router.add_get("/hlwyy/business-zhfw/account/key", self._account_key)
+        self.app.router.add_post("/hlwyy/business-zhfw/account/loginNew3", self._login)
+        self.app.router.add_get("/hlwyy/business-ggfw/khrydl/getKfrydl", self._daily)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self, port: int = 0):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.request_count += 1
+        delay = self._latency + (random.uniform(0, self._jitter) if self._jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        return await handler(request)
+
+    async def _dldf_list(self, request):
+        return web.json_response({
+            "code": 0,
+            "data": {
+                "qjwyj": "0",
+                "zmye": "888.88",
+                "d_date": datetime.datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S"),
+                "name": f"某小区{request.query.get('yhdabh')}",
+                "qjdf": "0"
+            }
+        })
+
+    async def _zzt_list(self, request):
+        return web.json_response({
+            "code": 0,
+            "data": {
+                "df": DF,
+                "dl": DL,
+                "bqdl": "226.00",
+                "yf": list(range(1, 13)) + [12],
+                "bqdf": "96.59"
+            }
+        })
+
+    async def _query_df_info_new(self, request):
+        return web.json_response({
+            "code": 0,
+            "data": {
+                "gsbh": "01",
+                "limitFlag": "02",
+                "qjwyj": "0.0",
+                "syje": "888.88",
+                "name": "某****某层东",
+                "addr": "******某层东",
+                "khxzmc": "城镇居民生活用电",
+                "sfyxjf": "01"
+            }
+        })
+
+    async def _account_key(self, request):
+        return web.json_response({"code": 0, "data": "MIGfMA0GCSqGSIb3DQEBAQUAA4GNADCBiQKBgQC"})
+
+    async def _login(self, request):
+        return web.json_response({"code": 0, "data": {"token": "stub-token"}})
+
+    async def _daily(self, request):
+        days = int(request.query.get("ts", 30))
+        today = datetime.datetime.now(tz).date()
+        data = [
+            {
+                "rq": (today - datetime.timedelta(days=i)).strftime("%Y/%m/%d"),
+                "dl": "%.2f" % (8 + (i % 7) * 1.5)
+            }
+            for i in range(days, 0, -1)
+        ]
+        return web.json_response({"code": 0, "data": data})
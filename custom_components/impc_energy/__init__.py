@@ -1,17 +1,75 @@
+import asyncio
+import datetime
 import logging
+
+import voluptuous as vol
+
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import HomeAssistant, Event, ServiceCall, callback
+import homeassistant.helpers.config_validation as cv
 from .const import (
     DOMAIN,
+    DATA_PHASES,
+    DATA_MDEJ_CLIENTS,
+    DATA_MDEJ_SESSION,
+    DATA_MDEJ_SESSION_UNSUB,
     ATTR_ACCOUNT_NAME,
     ATTR_ACCOUNT_NUMBER,
     ATTR_USERNAME,
     ATTR_PASSWORD,
     ATTR_TOKEN,
-    ATTR_LOGIN_PAYLOAD
+    ATTR_TRACE,
+    ATTR_YEARS,
+    ATTR_FORCE,
+    ATTR_START_YEAR,
+    ATTR_END_YEAR,
+    ATTR_LOGIN_PAYLOAD,
+    ATTR_PUBLIC_KEY,
+    DATA_COORDINATOR,
+    HISTORY_BACKFILL_MAX_YEARS,
+    HISTORY_BACKFILL_YEARS,
+    SERVICE_BACKFILL_HISTORY
 )
+from .client_registry import MdejClientRegistry
+from .mdej_api import create_session
+from .rate_limit import get_shared_limiter
+from .scheduler import AdaptiveScheduler, PhaseAllocator
+from .store import DailyStore, HistoryStore
 
 _LOGGER = logging.getLogger(__name__)
+tz = datetime.timezone(datetime.timedelta(hours=+8))
+
+
+def _resolve_backfill_years(data: dict) -> dict:
+    """
+    确定回填的年份范围
+    未指定结束年份时为去年, 未指定开始年份时从结束年份往前 years 年
+    """
+    this_year = datetime.datetime.now(tz).year
+    end_year = data.get(ATTR_END_YEAR, this_year - 1)
+    start_year = data.get(ATTR_START_YEAR, end_year - data[ATTR_YEARS] + 1)
+    if not start_year <= end_year <= this_year:
+        raise vol.Invalid(f"年份范围无效: [{start_year}, {end_year}], 需要满足 开始年份 <= 结束年份 <= {this_year}")
+    if end_year - start_year + 1 > HISTORY_BACKFILL_MAX_YEARS:
+        raise vol.Invalid(f"一次最多回填 {HISTORY_BACKFILL_MAX_YEARS} 年")
+    return {**data, ATTR_START_YEAR: start_year, ATTR_END_YEAR: end_year}
+
+
+BACKFILL_HISTORY_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(ATTR_ACCOUNT_NUMBER): cv.string,
+            vol.Optional(ATTR_YEARS, default=HISTORY_BACKFILL_YEARS): vol.All(
+                vol.Coerce(int), vol.Range(min=1, max=HISTORY_BACKFILL_MAX_YEARS)
+            ),
+            vol.Optional(ATTR_START_YEAR): vol.Coerce(int),
+            vol.Optional(ATTR_END_YEAR): vol.Coerce(int),
+            vol.Optional(ATTR_FORCE, default=False): cv.boolean,
+        }
+    ),
+    _resolve_backfill_years
+)
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
@@ -23,17 +81,30 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     account_name = entry.data.get(ATTR_ACCOUNT_NAME)
     app_username = entry.data.get(ATTR_USERNAME)
     app_login_payload = entry.data.get(ATTR_LOGIN_PAYLOAD)
+    app_public_key = entry.data.get(ATTR_PUBLIC_KEY)
     app_token = entry.data.get(ATTR_TOKEN)
 
     # 存储配置信息到 hass.data
     if DOMAIN not in hass.data:
         hass.data[DOMAIN] = {}
 
+    # 所有条目共用一个限速器, 按主机限制请求速率与并发, 避免启动时集中请求被限流
+    limiter = get_shared_limiter(hass)
+    # 各户号的轮询相位错开, 避免所有户号同时请求
+    hass.data[DOMAIN].setdefault(DATA_PHASES, PhaseAllocator()).register(account_number)
+
+    if app_username:
+        session = _ensure_mdej_session(hass)
+        # 同一蒙电e家用户名下的条目共用一个客户端
+        if DATA_MDEJ_CLIENTS not in hass.data[DOMAIN]:
+            hass.data[DOMAIN][DATA_MDEJ_CLIENTS] = MdejClientRegistry(hass, session, limiter)
+
     hass.data[DOMAIN][entry.entry_id] = {
         ATTR_ACCOUNT_NUMBER: account_number,
         ATTR_ACCOUNT_NAME: account_name,
         ATTR_USERNAME: app_username,
         ATTR_LOGIN_PAYLOAD: app_login_payload,
+        ATTR_PUBLIC_KEY: app_public_key,
         ATTR_TOKEN: app_token
     }
 
@@ -45,9 +116,54 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         _LOGGER.error(f"加载平台时出错: {e}")
         return False
 
+    entry.async_on_unload(entry.add_update_listener(_async_options_updated))
+    _async_register_services(hass)
     return True
 
 
+@callback
+def _async_register_services(hass: HomeAssistant):
+    """注册服务, 所有条目共用"""
+    if hass.services.has_service(DOMAIN, SERVICE_BACKFILL_HISTORY):
+        return
+
+    async def _async_backfill_history(call: ServiceCall):
+        """
+        回填历史数据
+        未指定户号时回填所有户号, 各户号并发进行, 请求节奏由共用的限速器控制
+        """
+        account_number = call.data.get(ATTR_ACCOUNT_NUMBER)
+        coordinators = [
+            entry_data[DATA_COORDINATOR]
+            for entry_data in hass.data[DOMAIN].values()
+            if isinstance(entry_data, dict) and DATA_COORDINATOR in entry_data
+            and account_number in (None, entry_data[ATTR_ACCOUNT_NUMBER])
+        ]
+        if not coordinators:
+            _LOGGER.warning("回填历史数据: 没有找到户号 [%s]", account_number)
+            return
+        await asyncio.gather(*(coordinator.async_backfill_history(call.data[ATTR_START_YEAR],
+                                                                  call.data[ATTR_END_YEAR],
+                                                                  call.data[ATTR_FORCE])
+                               for coordinator in coordinators))
+
+    hass.services.async_register(DOMAIN, SERVICE_BACKFILL_HISTORY, _async_backfill_history,
+                                 schema=BACKFILL_HISTORY_SCHEMA)
+
+
+async def _async_options_updated(hass: HomeAssistant, entry: ConfigEntry):
+    """选项变化时开关耗时追踪, 不需要重新加载"""
+    coordinator = hass.data[DOMAIN].get(entry.entry_id, {}).get(DATA_COORDINATOR)
+    if coordinator is None:
+        return
+    trace = entry.options.get(ATTR_TRACE, False)
+    if coordinator.tracer.enabled != trace:
+        _LOGGER.info("户号: [%s], 耗时追踪: [%s]", coordinator.account_number, trace)
+        coordinator.tracer.enabled = trace
+        if not trace:
+            coordinator.tracer.clear()
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """当用户删除集成时调用，用于清理和卸载平台。"""
     _LOGGER.debug("Unloading entry: %s", entry.data)
@@ -58,5 +174,67 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     # 清理存储的数据
     if DOMAIN in hass.data:
         hass.data[DOMAIN].pop(entry.entry_id)
+        if DATA_PHASES in hass.data[DOMAIN]:
+            hass.data[DOMAIN][DATA_PHASES].unregister(entry.data[ATTR_ACCOUNT_NUMBER])
+
+        # 最后一个条目卸载后关闭共用的 session
+        if not _has_loaded_entries(hass):
+            hass.services.async_remove(DOMAIN, SERVICE_BACKFILL_HISTORY)
+            hass.data[DOMAIN].pop(DATA_MDEJ_CLIENTS, None)
+            await _async_close_mdej_session(hass)
 
     return True
+
+
+def _has_loaded_entries(hass: HomeAssistant) -> bool:
+    """是否还有已加载的配置条目"""
+    return any(e.entry_id in hass.data[DOMAIN] for e in hass.config_entries.async_entries(DOMAIN))
+
+
+@callback
+def _ensure_mdej_session(hass: HomeAssistant):
+    """
+    创建所有条目共用的蒙电e家 session
+    连接池与DNS缓存在所有户号之间共享, Home Assistant 关闭时释放
+    """
+    session = hass.data[DOMAIN].get(DATA_MDEJ_SESSION)
+    if session is not None and not session.closed:
+        return session
+
+    # 旧 session 已关闭时重新创建, 先取消旧 session 的关闭监听, 避免监听越积越多
+    unsub = hass.data[DOMAIN].pop(DATA_MDEJ_SESSION_UNSUB, None)
+    if unsub is not None:
+        unsub()
+
+    session = hass.data[DOMAIN][DATA_MDEJ_SESSION] = create_session()
+
+    async def _async_close_session(event: Event):
+        # 监听只触发一次, 触发后不能再取消
+        hass.data[DOMAIN].pop(DATA_MDEJ_SESSION_UNSUB, None)
+        if not session.closed:
+            await session.close()
+
+    hass.data[DOMAIN][DATA_MDEJ_SESSION_UNSUB] = hass.bus.async_listen_once(
+        EVENT_HOMEASSISTANT_CLOSE, _async_close_session
+    )
+    return session
+
+
+async def _async_close_mdej_session(hass: HomeAssistant):
+    """
+    关闭共用的蒙电e家 session, 并取消关闭监听
+    """
+    unsub = hass.data[DOMAIN].pop(DATA_MDEJ_SESSION_UNSUB, None)
+    if unsub is not None:
+        unsub()
+    session = hass.data[DOMAIN].pop(DATA_MDEJ_SESSION, None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """删除配置条目时调用，清理本地缓存。"""
+    account_number = entry.data[ATTR_ACCOUNT_NUMBER]
+    await HistoryStore(hass, account_number).async_remove()
+    await DailyStore(hass, account_number).async_remove()
+    await AdaptiveScheduler(hass, account_number, []).async_remove()
@@ -0,0 +1,263 @@
+# 批量导出
+# 不需要运行 Home Assistant, 批量获取多个户号的余额, 近12个月历史数据及每日数据, 逐条写入 CSV / JSONL
+# 但需要安装 homeassistant 包: 以 python -m 运行时会先导入集成的 __init__, 其中依赖 homeassistant 与 voluptuous
+#
+# 用法:
+#   python -m custom_components.impc_energy.bulk_export accounts.txt -o export.csv
+#   python -m custom_components.impc_energy.bulk_export accounts.txt -o export.jsonl --daily-days 30 --mdej-token xxx
+#   IMPC_MDEJ_PASSWORD=xxx python -m custom_components.impc_energy.bulk_export accounts.txt --daily-days 30 --mdej-username xxx
+#
+# 密码不通过命令行参数传入 (会出现在进程列表与 shell 历史中), 未设置环境变量时交互输入
+# accounts.txt 每行一个户号, 空行与 # 开头的行会被忽略; 输入为 - 时从标准输入读取
+
+import argparse
+import asyncio
+import csv
+import datetime
+import getpass
+import json
+import logging
+import os
+import sys
+
+from typing import IO, Iterable, Iterator, Optional, Tuple
+
+from .const import (
+    ATTR_BALANCE,
+    ATTR_BILL,
+    ATTR_CONSUMPTION,
+    ATTR_CURRENT,
+    ATTR_DAILY,
+    ATTR_HISTORY,
+    ATTR_MONTH,
+    BULK_EXPORT_CONCURRENCY,
+    BULK_EXPORT_PASSWORD_ENV,
+    DAILY_MAX_FETCH_DAYS,
+    HOST_RATE_LIMITS
+)
+from .energy_api import EnergyAPI
+from .mdej_api import MdejAPI, create_session
+from .rate_limit import HostRateLimiter
+from .series import json_default
+from .token_manager import MdejTokenManager
+
+_LOGGER = logging.getLogger(__name__)
+tz = datetime.timezone(datetime.timedelta(hours=+8))
+
+
+def iter_account_numbers(lines: Iterable[str]) -> Iterator[str]:
+    """
+    逐行读取户号, 忽略空行与 # 开头的注释
+    """
+    for line in lines:
+        account_number = line.strip()
+        if account_number and not account_number.startswith("#"):
+            yield account_number
+
+
+class JsonlWriter(object):
+    """
+    每个户号一行 JSON
+    每月/每日数据为 {"start": 第一个周期, "bill"/"consumption": [...]} 的数组形式, 缺失的周期为 null
+    """
+
+    def __init__(self, stream: IO[str]):
+        self._stream = stream
+
+    def write(self, record: dict):
+        self._stream.write(json.dumps(record, ensure_ascii=False, default=json_default) + "\n")
+        self._stream.flush()
+
+
+class CsvWriter(object):
+    """
+    长表格式, 每个户号的余额, 每月数据, 本期数据与每日数据各占一行
+    """
+
+    FIELDS = ("account_number", "type", "period", "balance", "bill", "consumption", "error")
+
+    def __init__(self, stream: IO[str]):
+        self._stream = stream
+        self._writer = csv.DictWriter(stream, fieldnames=self.FIELDS)
+        self._writer.writeheader()
+
+    def write(self, record: dict):
+        account_number = record["account_number"]
+        rows = []
+
+        balance = record.get(ATTR_BALANCE)
+        if balance is not None:
+            rows.append({"type": ATTR_BALANCE, "period": record["query_time"], "balance": balance[ATTR_BALANCE]})
+
+        history = record.get(ATTR_HISTORY)
+        if history is not None:
+            for month, values in history[ATTR_HISTORY].items():
+                rows.append({"type": ATTR_MONTH, "period": month, **values})
+            current = history[ATTR_CURRENT]
+            rows.append({"type": ATTR_CURRENT, "period": ATTR_CURRENT,
+                         "bill": current[ATTR_BILL], "consumption": current[ATTR_CONSUMPTION]})
+
+        daily = record.get(ATTR_DAILY)
+        if daily is not None:
+            for date, values in daily.items():
+                rows.append({"type": ATTR_DAILY, "period": date.isoformat(), **values})
+
+        for source, error in record["errors"].items():
+            rows.append({"type": "error", "period": source, "error": error})
+
+        self._writer.writerows({"account_number": account_number, **row} for row in rows)
+        self._stream.flush()
+
+
+async def async_export_account(energy_api: EnergyAPI, token_manager: Optional[MdejTokenManager] = None,
+                               daily_days: int = 0) -> dict:
+    """
+    获取一个户号的数据
+    各数据源分别处理错误, 某个数据源失败时记录在 errors 中, 不影响其他数据源
+
+    :param token_manager: 蒙电e家登录, 为空时不获取每日数据
+    :param daily_days: 获取最近多少天的每日数据, 最多 DAILY_MAX_FETCH_DAYS 天
+
+    :return: {account_number, query_time, balance, history, daily, errors}
+    """
+    record = {
+        "account_number": energy_api.account_number,
+        "query_time": datetime.datetime.now(tz).isoformat(timespec="seconds"),
+        "errors": {},
+    }
+
+    fetchers = {
+        ATTR_BALANCE: energy_api.get_basic_new,
+        ATTR_HISTORY: energy_api.get_history_data,
+    }
+    if token_manager is not None and daily_days > 0:
+        # 接口单次最多返回 DAILY_MAX_FETCH_DAYS 天
+        days = min(daily_days, DAILY_MAX_FETCH_DAYS)
+        fetchers[ATTR_DAILY] = lambda: token_manager.async_call(
+            token_manager.api.get_daily, days, energy_api.account_number)
+
+    for source, fetcher in fetchers.items():
+        try:
+            record[source] = await fetcher()
+        except Exception as e:
+            _LOGGER.error("导出失败, 户号: [%s], 数据: [%s], 错误: [%s]", energy_api.account_number, source, e)
+            record[source] = None
+            record["errors"][source] = f"{type(e).__name__}: {e}"
+
+    return record
+
+
+async def async_bulk_export(account_numbers: Iterable[str], writer, session, limiter: HostRateLimiter,
+                            concurrency: int = BULK_EXPORT_CONCURRENCY,
+                            token_manager: Optional[MdejTokenManager] = None, daily_days: int = 0) -> Tuple[int, int]:
+    """
+    批量导出
+    固定数量的 worker 依次从 account_numbers 中取户号, 结果获取后立即写入, 内存占用与户号数量无关;
+    请求速率与并发另由 limiter 按主机限制
+
+    :param account_numbers: 户号, 可以是惰性的迭代器
+    :param writer: JsonlWriter 或 CsvWriter
+    :return: (导出的户号数, 有数据源失败的户号数)
+    """
+    accounts = iter(account_numbers)
+    exported = 0
+    failed = 0
+
+    async def _worker():
+        nonlocal exported, failed
+        # 单线程事件循环中 next() 不会被并发调用
+        for account_number in accounts:
+            energy_api = EnergyAPI(session, account_number, limiter=limiter)
+            record = await async_export_account(energy_api, token_manager, daily_days)
+            writer.write(record)
+            exported += 1
+            if record["errors"]:
+                failed += 1
+            if exported % 100 == 0:
+                _LOGGER.info("已导出 [%d] 个户号", exported)
+
+    await asyncio.gather(*(_worker() for _ in range(max(1, concurrency))))
+    return exported, failed
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量导出户号的余额, 历史数据与每日数据")
+    parser.add_argument("input", help="户号列表文件, 每行一个; - 为标准输入")
+    parser.add_argument("-o", "--output", default="-", help="输出文件, 默认为标准输出")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="输出格式, 默认按输出文件扩展名判断, 否则为 jsonl")
+    parser.add_argument("--concurrency", type=int, default=BULK_EXPORT_CONCURRENCY, help="同时处理的户号数")
+    parser.add_argument("--rate", type=float, help="每个主机每秒请求数, 默认使用集成中的限速参数")
+    parser.add_argument("--daily-days", type=int, default=0,
+                        help=f"导出最近多少天的每日数据 (最多 {DAILY_MAX_FETCH_DAYS} 天), 需要蒙电e家登录信息")
+    parser.add_argument("--mdej-token", help="蒙电e家 token, 不需要交互")
+    parser.add_argument("--mdej-username",
+                        help=f"蒙电e家用户名, 密码从环境变量 {BULK_EXPORT_PASSWORD_ENV} 读取, 未设置时交互输入")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+def _get_mdej_password(username: str) -> str:
+    """
+    从环境变量读取蒙电e家密码, 未设置时交互输入
+    """
+    password = os.environ.get(BULK_EXPORT_PASSWORD_ENV)
+    if password:
+        return password
+    return getpass.getpass(f"蒙电e家用户 [{username}] 的密码: ")
+
+
+async def _async_main(args) -> int:
+    if args.rate:
+        limit = (args.rate, max(1.0, args.rate), args.concurrency)
+        limiter = HostRateLimiter(limits={host: limit for host in HOST_RATE_LIMITS}, default=limit)
+    else:
+        limiter = HostRateLimiter()
+
+    if args.daily_days > DAILY_MAX_FETCH_DAYS:
+        _LOGGER.warning("接口单次最多返回 [%d] 天的每日数据, --daily-days 按 [%d] 处理",
+                        DAILY_MAX_FETCH_DAYS, DAILY_MAX_FETCH_DAYS)
+        args.daily_days = DAILY_MAX_FETCH_DAYS
+
+    output_format = args.format or ("csv" if args.output.endswith(".csv") else "jsonl")
+    input_stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output_stream = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    session = create_session(limit=args.concurrency * 2, limit_per_host=args.concurrency)
+
+    try:
+        token_manager = None
+        if args.daily_days > 0:
+            if not args.mdej_token and not (args.mdej_username and args.mdej_password):
+                raise SystemExit(f"导出每日数据需要 --mdej-token, 或 --mdej-username 及密码 ({BULK_EXPORT_PASSWORD_ENV})")
+            mdej_api = MdejAPI(args.mdej_username, session, limiter=limiter)
+            await mdej_api.initialize(username=args.mdej_username, pwd=args.mdej_password, token=args.mdej_token)
+            # 使用用户名密码登录时, 导出过程中 token 失效可以自动重新登录
+            token_manager = MdejTokenManager(mdej_api, mdej_api.login_payload, public_key=mdej_api.public_key)
+
+        writer = CsvWriter(output_stream) if output_format == "csv" else JsonlWriter(output_stream)
+        exported, failed = await async_bulk_export(
+            iter_account_numbers(input_stream), writer, session, limiter,
+            concurrency=args.concurrency, token_manager=token_manager, daily_days=args.daily_days
+        )
+    finally:
+        await session.close()
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+
+    print(f"导出户号: {exported}, 存在失败: {failed}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    logging.basicConfig(level=args.log_level)
+    # 在事件循环启动前读取密码, 交互输入不阻塞请求
+    args.mdej_password = None
+    if args.daily_days > 0 and args.mdej_username and not args.mdej_token:
+        args.mdej_password = _get_mdej_password(args.mdej_username)
+    sys.exit(asyncio.run(_async_main(args)))
+
+
+if __name__ == "__main__":
+    main()
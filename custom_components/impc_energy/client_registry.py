@@ -0,0 +1,89 @@
+# 按蒙电e家用户名共享客户端
+
+import logging
+
+from typing import Dict, Optional, Set
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+
+from .const import (
+    DOMAIN,
+    ATTR_TOKEN,
+    ATTR_USERNAME
+)
+from .mdej_api import MdejAPI
+from .rate_limit import HostRateLimiter
+from .token_manager import MdejTokenManager
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class MdejClient(object):
+    """
+    一个蒙电e家登录对应的客户端
+    同一用户名下的所有户号共用 token, session 与公钥, 只需登录一次
+    """
+
+    def __init__(self, api: MdejAPI, token_manager: MdejTokenManager):
+        self.api = api
+        self.token_manager = token_manager
+        self.entry_ids: Set[str] = set()
+
+
+class MdejClientRegistry(object):
+    """
+    按用户名登记的蒙电e家客户端
+    所有条目共用 hass.data[DOMAIN] 中的同一个实例; 条目加载时获取, 卸载时释放, 最后一个条目释放后移除
+    """
+
+    def __init__(self, hass: HomeAssistant, session, limiter: HostRateLimiter):
+        self._hass = hass
+        self._session = session
+        self._limiter = limiter
+        self._clients: Dict[str, MdejClient] = {}
+
+    async def async_acquire(self, entry: ConfigEntry, username: str, token: str,
+                            login_payload: Optional[str], public_key: Optional[str] = None) -> MdejClient:
+        client = self._clients.get(username)
+        if client is None:
+            api = MdejAPI(username, self._session, self._limiter)
+            await api.initialize(token=token)
+
+            @callback
+            def _on_token_refreshed(new_token: str):
+                self._async_save_token(username, new_token)
+
+            client = self._clients[username] = MdejClient(
+                api, MdejTokenManager(api, login_payload, _on_token_refreshed, public_key=public_key)
+            )
+            _LOGGER.debug("创建蒙电e家客户端, 用户: [%s]", username)
+        elif login_payload and not client.token_manager.login_payload:
+            client.token_manager.login_payload = login_payload
+            client.token_manager.public_key = public_key
+
+        client.entry_ids.add(entry.entry_id)
+        return client
+
+    @callback
+    def async_release(self, username: str, entry_id: str):
+        client = self._clients.get(username)
+        if client is None:
+            return
+        client.entry_ids.discard(entry_id)
+        if not client.entry_ids:
+            self._clients.pop(username)
+            _LOGGER.debug("移除蒙电e家客户端, 用户: [%s]", username)
+
+    @callback
+    def _async_save_token(self, username: str, token: str):
+        """
+        新 token 写回该用户名下的所有配置条目, 重启后继续使用
+        """
+        for entry in self._hass.config_entries.async_entries(DOMAIN):
+            if entry.data.get(ATTR_USERNAME) != username:
+                continue
+            self._hass.config_entries.async_update_entry(entry, data={**entry.data, ATTR_TOKEN: token})
+            entry_data = self._hass.data[DOMAIN].get(entry.entry_id)
+            if entry_data is not None:
+                entry_data[ATTR_TOKEN] = token
@@ -1,6 +1,7 @@
 import logging
 import voluptuous as vol
 from homeassistant import config_entries
+from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
@@ -13,10 +14,13 @@ from .const import (
     ATTR_USERNAME,
     ATTR_PASSWORD,
     ATTR_TOKEN,
-    ATTR_LOGIN_PAYLOAD
+    ATTR_TRACE,
+    ATTR_LOGIN_PAYLOAD,
+    ATTR_PUBLIC_KEY
 )
 from .energy_api import EnergyAPI
 from .mdej_api import MdejAPI
+from .rate_limit import get_shared_limiter
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -42,6 +46,11 @@ class IMPCConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> config_entries.OptionsFlow:
+        return IMPCOptionsFlow(config_entry)
+
     async def async_step_user(self, user_input=None) -> FlowResult:
         """用户步骤：获取账号配置。"""
         errors = {}
@@ -56,7 +65,8 @@ class IMPCConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 try:
                     # 直接使用导入的 async_get_clientsession 获取 session
                     session = async_get_clientsession(self.hass)
-                    api = EnergyAPI(session, account_number)
+                    # 与已有条目共用限速器, 请求计入同一主机的限额
+                    api = EnergyAPI(session, account_number, get_shared_limiter(self.hass))
                     basic_info = await api.get_basic()  # 获取账户基本信息
 
                     # 如果成功获取账户名
@@ -103,9 +113,11 @@ class IMPCConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             password = user_input[ATTR_PASSWORD]
 
             try:
-                api = MdejAPI(username)
+                api = MdejAPI(username, async_get_clientsession(self.hass), get_shared_limiter(self.hass))
                 await api.initialize(username=username, pwd=password)
                 login_payload = api.login_payload
+                # login_payload 是用这个公钥加密的, 重新登录时需要一起发送
+                public_key = api.public_key
                 app_token = api.token
 
                 account_data = self.context[ATTR_ACCOUNT_DATA]
@@ -113,6 +125,7 @@ class IMPCConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                     **account_data,
                     ATTR_USERNAME: username,
                     ATTR_LOGIN_PAYLOAD: login_payload,
+                    ATTR_PUBLIC_KEY: public_key,
                     ATTR_TOKEN: app_token
                 }
 
@@ -130,3 +143,23 @@ class IMPCConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             data_schema=STEP_MDEJ_DATA_SCHEMA,
             errors=errors
         )
+
+
+class IMPCOptionsFlow(config_entries.OptionsFlow):
+    """选项: 调试用的耗时追踪"""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry):
+        self._config_entry = config_entry
+
+    async def async_step_init(self, user_input=None) -> FlowResult:
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(ATTR_TRACE, default=self._config_entry.options.get(ATTR_TRACE, False)): cv.boolean,
+                }
+            )
+        )
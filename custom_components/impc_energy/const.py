@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 DOMAIN = "impc_energy"
 
 BASE_ENERGY_API_URL = "http://yxwx.impc.com.cn"
@@ -11,15 +13,126 @@ ATTR_ACCOUNT_NAME = "account_name"
 ATTR_ACCOUNT_NUMBER = "account_number"
 ATTR_BALANCE = "balance"
 ATTR_BILL = "bill"
+ATTR_CATEGORY = "category"
 ATTR_CONFIG_MDEJ = "config_mdej"
 ATTR_CONSUMPTION = "consumption"
 ATTR_CURRENT = "current"
 ATTR_DAILY = "daily"
+ATTR_DAILY_AVERAGE = "daily_average"
 ATTR_DATE = "date"
+ATTR_DAYS = "days"
 ATTR_DESC = "desc"
+ATTR_END_YEAR = "end_year"
+ATTR_FORCE = "force"
 ATTR_HISTORY = "history"
+ATTR_LAST_QUERY = "last_query"
 ATTR_LOGIN_PAYLOAD = "login_payload"
 ATTR_MONTH = "month"
+ATTR_MONTH_TO_DATE = "month_to_date"
 ATTR_PASSWORD = "password"
+ATTR_PRICE = "price"
+ATTR_PROJECTED = "projected"
+ATTR_PUBLIC_KEY = "public_key"
+ATTR_START_YEAR = "start_year"
+ATTR_STATISTIC_ID = "statistic_id"
+ATTR_TIER = "tier"
 ATTR_TOKEN = "token"
+ATTR_TRACE = "trace"
 ATTR_USERNAME = "username"
+ATTR_YEARS = "years"
+
+# 每个主机的限速 (每秒请求数, 突发容量, 最大并发请求数)
+# 限速器由所有配置条目共用, 限制的是上游能承受的总请求量, 不提供按条目的选项; 基准测试与批量导出可以在构造时覆盖
+DEFAULT_RATE_LIMIT = (1.0, 2, 4)
+HOST_RATE_LIMITS = {
+    "yxwx.impc.com.cn": (1.0, 2, 4),
+    "mdej.impc.com.cn": (1.0, 2, 4),
+}
+
+# 蒙电e家连接池
+MDEJ_CONNECTION_LIMIT = 20
+MDEJ_CONNECTION_LIMIT_PER_HOST = 8
+MDEJ_DNS_CACHE_TTL = 300
+
+DATA_MDEJ_CLIENTS = "mdej_clients"
+DATA_MDEJ_SESSION = "mdej_session"
+# 关闭 session 的 EVENT_HOMEASSISTANT_CLOSE 监听的取消函数
+DATA_MDEJ_SESSION_UNSUB = "mdej_session_unsub"
+DATA_LIMITER = "limiter"
+DATA_PHASES = "phases"
+# hass.data[DOMAIN][entry_id] 中的协调器
+DATA_COORDINATOR = "coordinator"
+
+# 公钥缓存时间 (秒)
+MDEJ_PUBLIC_KEY_TTL = 3600
+
+# 蒙电e家 token 失效的判断依据
+MDEJ_AUTH_ERROR_CODES = {401, 403, "401", "403"}
+MDEJ_AUTH_ERROR_KEYWORDS = ("token", "Token", "登录", "过期")
+# 登录失败时, 提示信息中包含以下关键字视为公钥已更换, 登录负载无法解密
+MDEJ_PUBLIC_KEY_ERROR_KEYWORDS = ("解密", "公钥", "密钥", "publicKey")
+# token 到期前多久主动刷新 (秒), 仅当 token 中带有过期时间时生效
+MDEJ_TOKEN_REFRESH_MARGIN = 3600
+
+# 每日用电量
+DAILY_MAX_FETCH_DAYS = 30  # 接口单次最多返回的天数
+DAILY_OVERLAP_DAYS = 2  # 增量获取时向前多取的天数, 用于获取被修正的数据
+DAILY_RETENTION_DAYS = 730  # 本地保留的天数
+DAILY_DISPLAY_DAYS = 30  # 协调器数据中保留的最近天数, 没有本地序列时每次请求的天数
+DAILY_AVERAGE_DAYS = 7  # 日均电量传感器的窗口天数
+
+# 导入长期统计时重新导入已有的最后几个月, 回写结算后修正的数据
+STATISTICS_OVERLAP_MONTHS = 1
+
+# 自适应轮询 {数据源: (窗口内间隔, 窗口外间隔, 没有变化记录时的默认窗口)}
+# 余额/历史的默认窗口为每月2号前后, 每日数据的默认窗口为9点前后
+SCHEDULE_POLICIES = {
+    ATTR_BALANCE: (timedelta(hours=2), timedelta(hours=24), (2,)),
+    ATTR_HISTORY: (timedelta(hours=2), timedelta(hours=24), (2,)),
+    ATTR_DAILY: (timedelta(hours=1), timedelta(hours=12), (9,)),
+}
+SCHEDULE_MAX_CHANGES = 12  # 每个数据源保留的变化记录数
+SCHEDULE_MIN_INTERVAL = timedelta(minutes=5)
+# 启动后各户号的首次刷新在这段时间内按相位错开
+STARTUP_REFRESH_SPREAD = timedelta(minutes=2)
+
+# 重试策略 {接口: (最多尝试次数, 基础等待秒数, 最大等待秒数)}
+DEFAULT_RETRY_POLICY = (3, 1.0, 10.0)
+RETRY_POLICIES = {
+    "dldf/dldfList": (3, 1.0, 10.0),
+    "dldf/zztList": (3, 2.0, 15.0),
+    "znjf/queryDfInfoNew": (3, 1.0, 10.0),
+    "account/key": (3, 1.0, 10.0),
+    # 登录接口经常随机报500, 多试几次
+    "account/loginNew3": (5, 2.0, 20.0),
+    "khrydl/getKfrydl": (3, 2.0, 15.0),
+}
+# 熔断: 连续失败次数, 熔断时间 (秒)
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RECOVERY_TIME = 300
+
+# 接口统计: 计算延迟百分位数时保留的最近请求数
+METRICS_SAMPLE_SIZE = 200
+# 诊断传感器展示的接口
+METRICS_ENERGY_ENDPOINTS = ("znjf/queryDfInfoNew", "dldf/zztList")
+METRICS_MDEJ_ENDPOINTS = ("khrydl/getKfrydl", "account/loginNew3")
+
+# 耗时追踪: 每个户号最多保留的 span 数量
+TRACE_BUFFER_SIZE = 2000
+
+# 批量导出: 同时处理的户号数
+BULK_EXPORT_CONCURRENCY = 8
+# 批量导出使用用户名登录时, 从这个环境变量读取密码, 未设置时交互输入
+BULK_EXPORT_PASSWORD_ENV = "IMPC_MDEJ_PASSWORD"
+
+# 历史数据回填: 默认回填的年数, 最多回填的年数
+SERVICE_BACKFILL_HISTORY = "backfill_history"
+HISTORY_BACKFILL_YEARS = 5
+HISTORY_BACKFILL_MAX_YEARS = 20
+
+# 居民阶梯电价 (元/kWh), 按月用电量分档: (该档电量上限, 电价), 最后一档没有上限
+# 只用于本地估算, 实际电费以结算为准
+TARIFF_RESIDENTIAL_TIERS = ((170, 0.415), (260, 0.465), (None, 0.715))
+# 执行阶梯电价的用电类别 (khxzmc 中包含以下关键字); 合表用户不执行阶梯电价
+TARIFF_RESIDENTIAL_KEYWORDS = ("居民",)
+TARIFF_EXCLUDED_KEYWORDS = ("合表",)
@@ -0,0 +1,265 @@
+import datetime
+import hashlib
+import json
+import logging
+
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .energy_api import EnergyAPI
+from .mdej_api import MdejAPI
+from .scheduler import AdaptiveScheduler, PhaseAllocator, align_to_phase
+from .series import json_default
+from .statistics import async_import_daily_statistics, async_import_monthly_statistics
+from .store import DailyStore
+from .token_manager import MdejTokenManager
+from .tracing import Tracer, trace_span
+from .const import (
+    DOMAIN,
+    ATTR_BALANCE,
+    ATTR_DAILY,
+    ATTR_BILL,
+    ATTR_HISTORY,
+    DAILY_DISPLAY_DAYS,
+    DAILY_RETENTION_DAYS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+tz = datetime.timezone(timedelta(hours=+8))
+
+# Time between updating data
+SCAN_INTERVAL = timedelta(hours=8)
+
+
+def fingerprint(data: Any) -> str:
+    """
+    计算数据的指纹, 用于判断上游数据是否变化
+    """
+    normalized = json.dumps(data, sort_keys=True, ensure_ascii=False, default=json_default)
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class ImpcDataUpdateCoordinator(DataUpdateCoordinator):
+    """
+    每个配置条目(户号)一个协调器
+    在同一个更新周期内获取余额, 历史数据与每日数据, 并推送给该户号下的所有实体
+    """
+
+    def __init__(self, hass: HomeAssistant, energy_api: EnergyAPI, mdej_api: Optional[MdejAPI] = None,
+                 token_manager: Optional[MdejTokenManager] = None, daily_store: Optional[DailyStore] = None,
+                 scheduler: Optional[AdaptiveScheduler] = None, phases: Optional[PhaseAllocator] = None,
+                 trace: bool = False):
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN}_{energy_api.account_number}",
+            update_interval=SCAN_INTERVAL,
+        )
+        self.energy_api = energy_api
+        self.mdej_api = mdej_api
+        self.token_manager = token_manager
+        self.daily_store = daily_store
+        self.scheduler = scheduler
+        self.phases = phases
+        # 最后一次成功查询的时间
+        self.last_query: Optional[datetime.datetime] = None
+        # 各数据源的连续失败次数, 成功后清除
+        self.source_failures: Dict[str, int] = {}
+        # 各数据源上一次导入统计时的指纹
+        self._imported_fingerprints: Dict[str, str] = {}
+        # 更新周期的耗时追踪, 在选项中开启
+        self.tracer = Tracer(self.account_number, enabled=trace)
+
+    @property
+    def account_number(self) -> str:
+        return self.energy_api.account_number
+
+    @property
+    def account_name(self) -> str:
+        return self.energy_api.account_name
+
+    async def _async_update_data(self) -> Dict[str, Any]:
+        with self.tracer.activate(), trace_span("update"):
+            return await self._async_fetch_data()
+
+    @callback
+    def async_update_listeners(self) -> None:
+        with self.tracer.activate(), trace_span("update_listeners"):
+            super().async_update_listeners()
+
+    async def _async_fetch_data(self) -> Dict[str, Any]:
+        """
+        获取该户号的数据
+        有调度器时只获取已到期的数据源, 其余沿用上一次的结果;
+        单个数据源失败时保留其上一次的结果, 并记录连续失败次数;
+        只有获取的数据源全部失败, 且没有任何上一次的结果可用时, 才视为本次更新失败
+        (有调度器时通常每次只有一个数据源到期, 它失败不应使其他数据源仍然有效的实体不可用)
+
+        :return: {balance: {...}, history: {...}, daily: [...]}
+        """
+        now = datetime.datetime.now(tz)
+        previous = self.data or {}
+        data = dict(previous)
+        errors = []
+
+        fetchers = self.fetchers
+        if self.scheduler is not None:
+            due = self.scheduler.due_sources(now)
+            fetchers = {key: fetcher for key, fetcher in fetchers.items() if key in due}
+
+        for key, fetcher in fetchers.items():
+            try:
+                with trace_span(f"fetch {key}"):
+                    result = await fetcher()
+                if result is None:
+                    raise UpdateFailed(f"[{key}] 未获取到数据")
+                data[key] = result
+                self.source_failures.pop(key, None)
+                if key == ATTR_BALANCE and self.daily_store is not None:
+                    # 用于估算电费, 重启后余额未到期时沿用
+                    self.daily_store.update_basic(result)
+                if self.scheduler is not None:
+                    self.scheduler.record(key, now, fingerprint(result))
+            except Exception as e:
+                _LOGGER.error("更新数据失败, 户号: [%s], 数据: [%s], 错误: [%s]", self.account_number, key, e)
+                errors.append(key)
+                self.source_failures[key] = self.source_failures.get(key, 0) + 1
+                data[key] = previous.get(key)
+                if self.scheduler is not None:
+                    self.scheduler.record_failure(key, now)
+
+        self.update_interval = self._next_interval()
+        _LOGGER.debug("户号: [%s], 本次获取: [%s], 下次更新间隔: [%s]",
+                      self.account_number, list(fetchers), self.update_interval)
+
+        if fetchers and len(errors) == len(fetchers):
+            if not any(value is not None for value in data.values()):
+                raise UpdateFailed(f"户号 [{self.account_number}] 所有数据获取失败")
+            _LOGGER.warning("户号: [%s], 本次获取的数据源全部失败, 沿用上一次的数据: [%s]", self.account_number, errors)
+
+        await self._async_import_statistics(data, errors)
+
+        if len(errors) < len(fetchers):
+            self.last_query = now
+        return data
+
+    def mark_due(self, key: str):
+        """下次刷新时获取该数据源"""
+        if self.scheduler is not None:
+            self.scheduler.mark_due(key)
+
+    def _next_interval(self) -> timedelta:
+        """
+        下次更新的间隔
+        由调度器决定下次的时间, 再推迟到本户号的相位上, 使各户号的请求在周期内均匀错开
+        """
+        now = datetime.datetime.now(tz)
+        if self.scheduler is not None:
+            delay = self.scheduler.next_delay(now)
+            period = self.scheduler.phase_period
+        else:
+            delay = period = SCAN_INTERVAL
+
+        if self.phases is None:
+            return delay
+        return align_to_phase(now + delay, period, self.phases.fraction(self.account_number)) - now
+
+    @property
+    def fetchers(self) -> Dict[str, Any]:
+        """各数据源的获取方法"""
+        fetchers = {
+            ATTR_BALANCE: self.energy_api.get_basic_new,
+            ATTR_HISTORY: self.energy_api.get_history_data,
+        }
+        if self.mdej_api:
+            fetchers[ATTR_DAILY] = self._async_get_daily
+        return fetchers
+
+    async def _async_import_statistics(self, data: Dict[str, Any], errors: list):
+        """
+        将本次获取的历史数据与每日数据导入长期统计
+        """
+        importers = {
+            ATTR_HISTORY: lambda: async_import_monthly_statistics(
+                self.hass, self.account_number, self.account_name, data[ATTR_HISTORY]),
+            ATTR_DAILY: lambda: async_import_daily_statistics(
+                self.hass, self.account_number, self.account_name,
+                self.daily_store.recent(DAILY_RETENTION_DAYS) if self.daily_store else data[ATTR_DAILY]),
+        }
+
+        for key, importer in importers.items():
+            if key in errors or not data.get(key):
+                continue
+
+            # 数据没有变化时跳过, 不必查询数据库
+            data_fingerprint = fingerprint(data[key])
+            if self._imported_fingerprints.get(key) == data_fingerprint:
+                continue
+
+            try:
+                with trace_span(f"import_statistics {key}"):
+                    await importer()
+                self._imported_fingerprints[key] = data_fingerprint
+            except Exception as e:
+                _LOGGER.error("导入统计数据失败, 户号: [%s], 数据: [%s], 错误: [%s]", self.account_number, key, e)
+
+    async def async_backfill_history(self, start_year: int, end_year: int, force: bool = False) -> int:
+        """
+        回填 start_year 到 end_year (含) 的历史数据, 已保存的年份不再请求
+        force 为 True 时先清除这些年份的缓存, 全部重新请求 (例如上游修正了已结算的数据)
+        回填后用本地保存的全部月份及当前的滚动数据, 全量重新导入月度统计
+
+        :return: 导入的月份数
+        """
+        history_store = self.energy_api.history_store
+        if history_store is None:
+            return 0
+
+        with self.tracer.activate(), trace_span("backfill_history", start_year=start_year, end_year=end_year):
+            wanted = range(start_year, end_year + 1)
+            if force:
+                await history_store.async_invalidate(wanted)
+            fetched = await self.energy_api.get_history_years(wanted)
+            missing = [year for year in wanted if year not in fetched]
+            if missing:
+                _LOGGER.warning("回填历史数据, 户号: [%s], 以下年份获取失败: [%s]", self.account_number, missing)
+
+            series = history_store.monthly_series()
+            # 未结算的月份使用当前的滚动数据
+            recent = (self.data or {}).get(ATTR_HISTORY)
+            if recent:
+                for month, values in recent[ATTR_HISTORY].items():
+                    if series.get(month, ATTR_BILL) is None:
+                        series.set(month, **values)
+
+            await async_import_monthly_statistics(self.hass, self.account_number, self.account_name,
+                                                  {ATTR_HISTORY: series}, full=True)
+
+        _LOGGER.info("回填历史数据完成, 户号: [%s], 年份: [%s], 月份数: [%d]",
+                     self.account_number, history_store.years, len(series))
+        return len(series)
+
+    async def _async_get_daily(self):
+        """
+        获取每日用电数据
+        有本地序列时只请求缺失的天数并合并, 返回最近 DAILY_DISPLAY_DAYS 天
+        """
+        days = self.daily_store.days_to_fetch() if self.daily_store else DAILY_DISPLAY_DAYS
+
+        # 同一登录下的多个户号共用 mdej_api, 需要传入户号
+        if self.token_manager is None:
+            daily_data = await self.mdej_api.get_daily(days, self.account_number)
+        else:
+            daily_data = await self.token_manager.async_call(self.mdej_api.get_daily, days, self.account_number)
+
+        if self.daily_store is None:
+            return daily_data
+
+        with trace_span("daily_merge", items=len(daily_data)):
+            changed = self.daily_store.merge(daily_data)
+        _LOGGER.debug("合并每日用电数据, 户号: [%s], 请求天数: [%d], 变化天数: [%d]", self.account_number, days, changed)
+        return self.daily_store.recent(DAILY_DISPLAY_DAYS)
@@ -0,0 +1,62 @@
+# 诊断信息下载
+
+from typing import Any, Dict
+
+from homeassistant.components.diagnostics import REDACTED, async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    ATTR_ACCOUNT_NAME,
+    ATTR_ACCOUNT_NUMBER,
+    ATTR_LOGIN_PAYLOAD,
+    ATTR_PASSWORD,
+    ATTR_TOKEN,
+    ATTR_USERNAME,
+    DATA_COORDINATOR
+)
+
+TO_REDACT = {
+    ATTR_ACCOUNT_NAME,
+    ATTR_ACCOUNT_NUMBER,
+    ATTR_LOGIN_PAYLOAD,
+    ATTR_PASSWORD,
+    ATTR_TOKEN,
+    ATTR_USERNAME,
+}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> Dict[str, Any]:
+    """
+    配置条目的诊断信息
+    包括协调器状态, 各接口的请求统计及耗时追踪, 户号, 户名及登录信息已脱敏
+    """
+    diagnostics = {
+        "entry": async_redact_data(dict(entry.data), TO_REDACT),
+        "options": dict(entry.options),
+    }
+
+    coordinator = hass.data.get(DOMAIN, {}).get(entry.entry_id, {}).get(DATA_COORDINATOR)
+    if coordinator is None:
+        return diagnostics
+
+    diagnostics["coordinator"] = {
+        "last_update_success": coordinator.last_update_success,
+        "last_query": coordinator.last_query.isoformat() if coordinator.last_query else None,
+        "update_interval": str(coordinator.update_interval),
+        "source_failures": dict(coordinator.source_failures),
+    }
+    diagnostics["metrics"] = {
+        "energy": coordinator.energy_api.metrics.as_dict(),
+    }
+    if coordinator.mdej_api is not None:
+        # 同一蒙电e家用户名下的户号共用这部分统计
+        diagnostics["metrics"]["mdej"] = coordinator.mdej_api.metrics.as_dict()
+
+    # 开启耗时追踪时附带最近的更新周期, 将 trace 字段另存为 JSON 即可在 chrome://tracing 或 Perfetto 中打开
+    if coordinator.tracer.enabled or len(coordinator.tracer):
+        # 追踪器以户号命名, 导出时替换
+        diagnostics["trace"] = coordinator.tracer.export_chrome_trace(name=REDACTED)
+
+    return diagnostics
@@ -4,6 +4,8 @@ import asyncio
 import aiohttp
 import logging
 
+from typing import Dict, Iterable, Optional
+
 from homeassistant.const import (
     ATTR_NAME
 )
@@ -11,21 +13,39 @@ from .const import (
     BASE_ENERGY_API_URL,
     ATTR_BALANCE,
     ATTR_BILL,
+    ATTR_CATEGORY,
     ATTR_CONSUMPTION,
     ATTR_MONTH,
     ATTR_HISTORY,
     ATTR_CURRENT
 )
+from .exceptions import ImpcApiError
+from .http_client import ApiClient
+from .metrics import ApiMetrics
+from .rate_limit import HostRateLimiter
+from .series import MonthlySeries
+from .tracing import trace_span
+from .transport import AiohttpTransport, Transport
 
 _LOGGER = logging.getLogger(__name__)
 tz = datetime.timezone(datetime.timedelta(hours=+8))
 
 
-class EnergyAPI(object):
-    def __init__(self, session: aiohttp.ClientSession, account_number):
+class EnergyAPI(ApiClient):
+    def __init__(self, session: aiohttp.ClientSession, account_number, limiter: HostRateLimiter,
+                 history_store=None, transport: Optional[Transport] = None, metrics: Optional[ApiMetrics] = None):
+        """
+        :param session: aiohttp session
+        :param account_number: 户号
+        :param history_store: 已结算年份的历史数据缓存 (store.HistoryStore), 为空时不缓存
+        :param transport: 传输层, 为空时通过 session 直接请求
+        限速器与接口统计见 ApiClient
+        """
+        super().__init__(transport or AiohttpTransport(session), limiter, metrics)
         self._account_number = account_number
         self._account_name = None
         self.session = session
+        self._history_store = history_store
 
     timeout = aiohttp.ClientTimeout(total=60)
     header = {
@@ -47,6 +67,18 @@ class EnergyAPI(object):
     def account_name(self) -> str:
         return self._account_name
 
+    @property
+    def history_store(self):
+        return self._history_store
+
+    async def _get_json(self, path: str, params: dict) -> dict:
+        """
+        发送GET请求并解析JSON
+        :raises ImpcApiError: 请求失败或返回的不是JSON
+        """
+        return await self._send_json("GET", BASE_ENERGY_API_URL + path, EnergyAPI.timeout,
+                                     params=params, headers=EnergyAPI.header)
+
     async def get_basic(self):
         """
         获取基本信息 (dldfList)
@@ -68,13 +100,9 @@ class EnergyAPI(object):
         param = {
             "yhdabh": self._account_number
         }
-        response = await self.session.get(BASE_ENERGY_API_URL + "/api/hlwyy/business-jffw/dldf/dldfList",
-                                          timeout=EnergyAPI.timeout,
-                                          params=param,
-                                          headers=EnergyAPI.header)
+        data = await self._get_json("/api/hlwyy/business-jffw/dldf/dldfList", param)
 
         try:
-            data = await response.json(encoding="utf-8")
             _LOGGER.info("基本信息(dldfList): [{}]".format(data))
 
             return {
@@ -82,9 +110,9 @@ class EnergyAPI(object):
                 # 余额采用get_basic_new中的syje, 所以这个方法不再返回剩余金额
                 # ATTR_BALANCE: float(data["data"]["zmye"])
             }
-        except:
-            data = await response.text()
+        except (KeyError, TypeError) as e:
             _LOGGER.error("获取基本信息(dldfList)错误, res: [{}]".format(data))
+            raise ImpcApiError(f"获取基本信息(dldfList)错误, res: [{data}]") from e
 
     async def get_history(self, year: int):
         """
@@ -151,49 +179,78 @@ class EnergyAPI(object):
             "yhdabh": self._account_number,
             "fxny": year
         }
-        response = await self.session.get(BASE_ENERGY_API_URL + "/api/hlwyy/business-jffw/dldf/zztList",
-                                          timeout=EnergyAPI.timeout,
-                                          params=param,
-                                          headers=EnergyAPI.header)
-
-        try:
-            data = await response.json(encoding="utf-8")
-            _LOGGER.info(f"历史数据, year: [{year}], data: [{data}]")
+        with trace_span("get_history", year=year):
+            data = await self._get_json("/api/hlwyy/business-jffw/dldf/zztList", param)
+        _LOGGER.info(f"历史数据, year: [{year}], data: [{data}]")
 
-            return data["data"]
-        except:
-            data = await response.text()
+        history = data.get("data") if isinstance(data, dict) else None
+        if not isinstance(history, dict) or "df" not in history or "dl" not in history:
             _LOGGER.error("获取历史数据错误, res: [{}]".format(data))
+            raise ImpcApiError(f"获取历史数据错误, year: [{year}], res: [{data}]")
+
+        return history
+
+    async def get_history_cached(self, year: int):
+        """
+        获取某年的历史数据, 已结算的年份优先从缓存读取
+        """
+        if self._history_store is not None:
+            cached = self._history_store.get(year)
+            if cached is not None:
+                _LOGGER.debug("使用缓存的历史数据, 户号: [%s], 年份: [%s]", self._account_number, year)
+                return cached
+
+        data = await self.get_history(year)
+        if data is not None and self._history_store is not None:
+            await self._history_store.async_set(year, data)
+        return data
+
+    async def get_history_years(self, years: Iterable[int]) -> Dict[int, dict]:
+        """
+        并发获取多个年份的历史数据, 用于回填
+        已缓存的年份不会请求; 请求节奏由限速器控制, 单个年份失败不影响其他年份
+
+        :return: {年份: zztList 数据}, 不包含失败的年份
+        """
+        years = sorted(set(years))
+        with trace_span("get_history_years", years=len(years)):
+            results = await asyncio.gather(*(self.get_history_cached(year) for year in years),
+                                           return_exceptions=True)
+
+        history = {}
+        for year, result in zip(years, results):
+            if isinstance(result, BaseException):
+                _LOGGER.error("获取历史数据失败, 户号: [%s], 年份: [%s], 错误: [%s]", self._account_number, year, result)
+                continue
+            history[year] = result
+        return history
 
     async def get_history_data(self):
+        """
+        获取最近12个月的历史数据及本期数据
+        去年与今年的数据并发获取, 请求节奏由限速器控制
+        去年已结算时直接使用缓存, 只有今年的数据需要请求
+        """
 
         now = datetime.datetime.now(tz)
         this_year = now.year
         this_month = now.month
 
-        data_list = []
-        last_year_data = await self.get_history(this_year - 1)
+        if this_month > 1:
+            last_year_data, this_year_data = await asyncio.gather(
+                self.get_history_cached(this_year - 1),
+                self.get_history(this_year)
+            )
+        else:
+            last_year_data = await self.get_history_cached(this_year - 1)
 
-        # last year
-        for i in range(this_month, 13):
-            month_str = "%d%02d" % (this_year - 1, i)
-            data_list.append({
-                ATTR_MONTH: month_str,
-                ATTR_BILL: last_year_data["df"][i - 1],
-                ATTR_CONSUMPTION: last_year_data["dl"][i - 1]
-            })
+        series = MonthlySeries()
 
-        await asyncio.sleep(5)
+        # last year
+        series.set_year(this_year - 1, last_year_data, range(this_month, 13))
 
         if this_month > 1:
-            this_year_data = await self.get_history(this_year)
-            for i in range(1, this_month):
-                month_str = "%d%02d" % (this_year, i)
-                data_list.append({
-                    ATTR_MONTH: month_str,
-                    ATTR_BILL: this_year_data["df"][i - 1],
-                    ATTR_CONSUMPTION: this_year_data["dl"][i - 1]
-                })
+            series.set_year(this_year, this_year_data, range(1, this_month))
 
         # 本期电费电量
         # "bqdf"与"bqdl"字段, 与数据列表的最后一项似乎都是本期电费电量, 但是"bqdf"与"bqdl"字段查询上一年数据时是0
@@ -212,14 +269,14 @@ class EnergyAPI(object):
             }
 
         return {
-            ATTR_HISTORY: data_list,
+            ATTR_HISTORY: series,
             ATTR_CURRENT: current
         }
 
     async def get_basic_new(self):
         """
         获取基本信息 (queryDfInfoNew)
-        包含syje与脱敏地址
+        包含syje, 用电类别khxzmc与脱敏地址
 
         res:
         {
@@ -242,19 +299,17 @@ class EnergyAPI(object):
         param = {
             "yhdabh": self._account_number
         }
-        response = await self.session.get(BASE_ENERGY_API_URL + "/api/hlwyy/business-jffw/znjf/queryDfInfoNew",
-                                          timeout=EnergyAPI.timeout,
-                                          params=param,
-                                          headers=EnergyAPI.header)
+        data = await self._get_json("/api/hlwyy/business-jffw/znjf/queryDfInfoNew", param)
 
         try:
-            data = await response.json(encoding="utf-8")
             _LOGGER.info("基本信息(queryDfInfoNew): [{}]".format(data))
 
             return {
                 # 这个接口返回的地址是脱敏后的地址, 所以方法不返回地址, 采用get_basic返回的地址
-                ATTR_BALANCE: float(data["data"]["syje"])
+                ATTR_BALANCE: float(data["data"]["syje"]),
+                # 用电类别, 用于选择阶梯电价估算本月电费
+                ATTR_CATEGORY: data["data"].get("khxzmc")
             }
-        except:
-            data = await response.text()
+        except (KeyError, TypeError, ValueError) as e:
             _LOGGER.error("获取基本信息(queryDfInfoNew)错误, res: [{}]".format(data))
+            raise ImpcApiError(f"获取基本信息(queryDfInfoNew)错误, res: [{data}]") from e
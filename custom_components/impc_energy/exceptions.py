@@ -0,0 +1,21 @@
+# 异常
+
+
+class ImpcApiError(Exception):
+    """接口请求失败或返回数据异常"""
+
+
+class ImpcServerError(ImpcApiError):
+    """服务器错误 (HTTP 5xx), 可以重试"""
+
+
+class CircuitOpenError(ImpcApiError):
+    """主机连续失败, 熔断期间不再发起请求"""
+
+
+class MdejAuthError(ImpcApiError):
+    """蒙电e家 token 无效或已过期, 需要重新登录"""
+
+
+class MdejPublicKeyError(ImpcApiError):
+    """蒙电e家登录负载无法用服务器当前的公钥解密, 需要用新的公钥重新加密"""
@@ -0,0 +1,66 @@
+# 接口请求的公共部分
+# 限速 -> 耗时追踪 -> 接口统计 -> 传输层 -> 状态码检查 -> JSON 解析, 整体按接口的重试策略重试
+
+import logging
+
+from typing import Optional
+
+import aiohttp
+
+from .exceptions import ImpcApiError, ImpcServerError
+from .metrics import ApiMetrics
+from .rate_limit import HostRateLimiter
+from .resilience import call_with_retry, get_endpoint_name
+from .tracing import trace_span
+from .transport import Transport, TransportResponse
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ApiClient(object):
+    """
+    EnergyAPI 与 MdejAPI 的基类
+    每次请求 (包括重试) 都经过限速器, 限制速率与并发; 网络错误与服务器错误按接口的重试策略重试
+
+    :param limiter: 限速器, 在 Home Assistant 中为所有条目及配置流程共用的实例 (rate_limit.get_shared_limiter)
+    :param transport: 传输层, 可替换为录制/回放的传输层
+    :param metrics: 接口统计, 为空时新建
+    """
+
+    def __init__(self, transport: Transport, limiter: HostRateLimiter, metrics: Optional[ApiMetrics] = None):
+        self._limiter = limiter
+        self._transport = transport
+        self.metrics = metrics or ApiMetrics()
+
+    def _check_status(self, response: TransportResponse, endpoint: str):
+        """
+        检查响应的状态码, 子类可以增加检查
+        :raises ImpcServerError: HTTP 5xx, 可以重试
+        """
+        if response.status >= 500:
+            raise ImpcServerError(f"[{endpoint}] HTTP 状态码 {response.status}, 响应: [{response.text}]")
+
+    async def _send_json(self, method: str, url: str, timeout: aiohttp.ClientTimeout, **kwargs) -> dict:
+        """
+        发送请求并解析JSON
+        :param kwargs: 传给传输层的 params / json / headers
+        :raises ImpcApiError: 请求失败或返回的不是JSON
+        """
+        endpoint = get_endpoint_name(url)
+
+        async def _request():
+            # 从 request 开始到 http 开始之间为在限速器中等待的时间
+            with trace_span(f"request {endpoint}"):
+                async with self._limiter.request(url):
+                    # 状态码检查放在 measure 内, 5xx 等错误响应计入接口的失败请求
+                    with trace_span("http"), self.metrics.measure(endpoint):
+                        response = await self._transport.request(method, url, timeout=timeout, **kwargs)
+                        self._check_status(response, endpoint)
+                try:
+                    with trace_span("json_decode", size=len(response.text)):
+                        return response.json()
+                except ValueError as e:
+                    raise ImpcApiError(f"[{endpoint}] 返回数据不是JSON, HTTP 状态码 {response.status}, "
+                                       f"响应: [{response.text}]") from e
+
+        return await call_with_retry(_request, endpoint, url, metrics=self.metrics)
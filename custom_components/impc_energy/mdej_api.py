@@ -3,26 +3,137 @@
 import datetime
 import aiohttp
 import asyncio
+import functools
 import logging
 
-from Crypto.PublicKey import RSA
-from Crypto.Cipher import PKCS1_v1_5
 import base64
 import json
+import time
+
+from typing import Awaitable, Callable, Optional
 
 from .const import (
     BASE_APP_API_URL,
-    ATTR_DATE,
-    ATTR_CONSUMPTION
+    ATTR_CONSUMPTION,
+    MDEJ_CONNECTION_LIMIT,
+    MDEJ_CONNECTION_LIMIT_PER_HOST,
+    MDEJ_DNS_CACHE_TTL,
+    MDEJ_PUBLIC_KEY_TTL,
+    MDEJ_AUTH_ERROR_CODES,
+    MDEJ_AUTH_ERROR_KEYWORDS,
+    MDEJ_PUBLIC_KEY_ERROR_KEYWORDS
 )
+from .exceptions import ImpcApiError, MdejAuthError, MdejPublicKeyError
+from .http_client import ApiClient
+from .metrics import ApiMetrics
+from .series import DailySeries
+from .rate_limit import HostRateLimiter
+from .tracing import trace_span
+from .transport import AiohttpTransport, Transport, TransportResponse
 
 _LOGGER = logging.getLogger(__name__)
 tz = datetime.timezone(datetime.timedelta(hours=+8))
 
 
-class MdejAPI(object):
-    def __init__(self, username):
+def create_session(limit: int = MDEJ_CONNECTION_LIMIT,
+                   limit_per_host: int = MDEJ_CONNECTION_LIMIT_PER_HOST,
+                   ttl_dns_cache: int = MDEJ_DNS_CACHE_TTL) -> aiohttp.ClientSession:
+    """
+    创建用于蒙电e家接口的长连接 session
+    连接池有总数及单主机上限, 并缓存DNS解析结果, 供多个户号共用
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=ttl_dns_cache,
+        use_dns_cache=True
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+class _PublicKeyCache(object):
+    """
+    进程内共享的公钥缓存
+    公钥与账户无关, 所有实例共用, 过期后重新获取; 并发登录时只会发起一次请求
+    """
+
+    def __init__(self, ttl: float = MDEJ_PUBLIC_KEY_TTL):
+        self._ttl = ttl
+        self._key = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, fetch: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        if self._key and time.monotonic() < self._expires_at:
+            return self._key
+
+        async with self._lock:
+            # 等待锁期间可能已被其他调用方获取
+            if self._key and time.monotonic() < self._expires_at:
+                return self._key
+
+            key = await fetch()
+            if key:
+                self._key = key
+                self._expires_at = time.monotonic() + self._ttl
+            return key
+
+    def invalidate(self):
+        self._key = None
+        self._expires_at = 0.0
+
+
+_public_key_cache = _PublicKeyCache()
+
+
+@functools.lru_cache(maxsize=4)
+def _get_cipher(pub_key_pem: str):
+    """
+    按公钥缓存加密器
+    pycryptodome 只在登录时用到, 在这里才导入, 不影响集成加载速度
+    """
+    from Crypto.PublicKey import RSA
+    from Crypto.Cipher import PKCS1_v1_5
+
+    return PKCS1_v1_5.new(RSA.importKey(pub_key_pem))
+
+
+def is_auth_error(resp_json: dict) -> bool:
+    """
+    根据响应判断是否为 token 失效
+    接口没有文档, 这里根据返回码及提示信息中的关键字判断
+    """
+    code = resp_json.get("code")
+    if code == 0:
+        return False
+    if code in MDEJ_AUTH_ERROR_CODES:
+        return True
+    msg = str(resp_json.get("msg") or resp_json.get("message") or "")
+    return any(keyword in msg for keyword in MDEJ_AUTH_ERROR_KEYWORDS)
+
+
+def is_public_key_error(resp_json: dict) -> bool:
+    """
+    根据登录响应判断是否为公钥已更换 (登录负载无法解密)
+    同样没有文档, 根据提示信息中的关键字判断
+    """
+    msg = str(resp_json.get("msg") or resp_json.get("message") or "")
+    return any(keyword in msg for keyword in MDEJ_PUBLIC_KEY_ERROR_KEYWORDS)
+
+
+class MdejAPI(ApiClient):
+    def __init__(self, username, session: aiohttp.ClientSession, limiter: HostRateLimiter,
+                 transport: Optional[Transport] = None,
+                 metrics: Optional[ApiMetrics] = None):
+        """
+        :param username: app用户名
+        :param session: 共用的 session, 由调用方负责关闭 (Home Assistant 中见 __init__._ensure_mdej_session)
+        :param transport: 传输层, 为空时通过 session 直接请求
+        限速器与接口统计见 ApiClient
+        """
+        super().__init__(transport or AiohttpTransport(session), limiter, metrics)
         self._username = username
+        self._session = session
         self._account_number = None
         self._account_name = None
         self._public_key = None
@@ -54,6 +165,11 @@ class MdejAPI(object):
     def token(self) -> str:
         return self._token
 
+    @property
+    def public_key(self) -> Optional[str]:
+        """计算 login_payload 时使用的公钥"""
+        return self._public_key
+
     @property
     def account_name(self) -> str:
         return self._account_name
@@ -72,6 +188,27 @@ class MdejAPI(object):
     def set_account_name(self, account_name):
         self._account_name = account_name
 
+    def _check_status(self, response: TransportResponse, endpoint: str):
+        """
+        :raises MdejAuthError: HTTP 401/403
+        :raises ImpcApiError: 其他非 200 的状态码
+        """
+        if response.status in (401, 403):
+            raise MdejAuthError(f"[{endpoint}] token 无效, HTTP 状态码 {response.status}, 响应: {response.text}")
+        if response.status != 200:
+            _LOGGER.error("请求失败, 接口: [%s], 状态码: [%d], 响应: [%s]", endpoint, response.status, response.text)
+        super()._check_status(response, endpoint)
+        if response.status != 200:
+            raise ImpcApiError(f"[{endpoint}] HTTP 状态码 {response.status}, 响应: {response.text}")
+
+    async def _request_json(self, method: str, path: str, headers: dict, **kwargs) -> dict:
+        """
+        发送请求并解析JSON
+        :raises MdejAuthError: HTTP 401/403
+        :raises ImpcApiError: 其他请求失败
+        """
+        return await self._send_json(method, f"{BASE_APP_API_URL}{path}", MdejAPI.timeout, headers=headers, **kwargs)
+
     def get_header_with_token(self):
         """
         获取添加token的请求头
@@ -81,57 +218,72 @@ class MdejAPI(object):
             "hlwyy-Token": self._token
         }
 
-    async def initialize(self, username=None, pwd=None, login_payload=None, token=None):
+    async def initialize(self, username=None, pwd=None, login_payload=None, token=None, public_key=None):
         """
         初始化 需要手动调用
-        获取公钥, 登录
+        使用token初始化时不需要公钥, 不发起请求; 否则获取公钥并登录
 
-        使用login_payload初始化时必报错, 原因未知
+        login_payload 是用公钥加密的, 登录时服务器按请求中的 publicKey 解密;
+        使用保存的 login_payload 初始化时必须同时传入当时的公钥, 否则服务器更换公钥后会登录失败
+        使用用户名密码初始化时, 若缓存的公钥已被服务器更换, 重新获取公钥并重试一次
+        :param public_key: 计算 login_payload 时使用的公钥
         :return:
         """
-        await self._get_public_key()
         if token:
             _LOGGER.debug("使用token初始化")
             self._token = token
+        elif login_payload is None:
+            if username is None or pwd is None:
+                raise ValueError("必须提供用户名和密码，或者直接提供 payload")
+            _LOGGER.debug("使用用户名密码初始化")
+            try:
+                await self._login_with_password(username, pwd)
+            except MdejPublicKeyError:
+                _LOGGER.warning("公钥已更换, 重新获取公钥后再次登录, 用户: [%s]", self._username)
+                await self._login_with_password(username, pwd)
         else:
-            if login_payload is None:
-                if username is None or pwd is None:
-                    raise ValueError("必须提供用户名和密码，或者直接提供 payload")
-                _LOGGER.debug("使用用户名密码初始化")
-                login_payload = self.cal_payload(username, pwd)
-            self._login_payload = login_payload
             _LOGGER.debug("使用login payload初始化")
-            self._token = await self.get_token(self._login_payload)
+            self._public_key = public_key
+            self._login_payload = login_payload
+            self._token = await self.get_token(self._login_payload, self._public_key)
 
-    async def _get_public_key(self):
-        _LOGGER.debug("开始获取公钥")
+    async def _login_with_password(self, username, pwd):
+        """
+        用当前的公钥加密用户名密码并登录
+        """
+        await self._ensure_public_key()
+        self._login_payload = await self.async_cal_payload(username, pwd)
+        self._token = await self.get_token(self._login_payload, self._public_key)
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(
-                        f"{BASE_APP_API_URL}/hlwyy/business-zhfw/account/key",
-                        timeout=MdejAPI.timeout,
-                        headers=MdejAPI.header
-                ) as response:
+    async def _ensure_public_key(self) -> Optional[str]:
+        """
+        获取公钥, 优先使用进程内缓存
+        """
+        self._public_key = await _public_key_cache.get(self._get_public_key)
+        if not self._public_key:
+            raise ImpcApiError("获取公钥失败")
+        return self._public_key
 
-                    if response.status != 200:
-                        text = await response.text()
-                        _LOGGER.error("获取公钥失败, 状态码: [%d], 响应: [%s]", response.status, text)
-                        return None
+    async def _get_public_key(self) -> Optional[str]:
+        """
+        从服务器获取公钥
+        """
+        _LOGGER.debug("开始获取公钥")
 
-                    resp_json = await response.json(encoding="utf-8")
-                    pub_key = resp_json.get("data")
+        try:
+            resp_json = await self._request_json("GET", "/hlwyy/business-zhfw/account/key", MdejAPI.header)
+        except Exception as e:
+            _LOGGER.error("获取公钥请求异常,  错误: [%s]", str(e))
+            return None
 
-                    if not pub_key:
-                        _LOGGER.error("获取公钥失败, 未获取到 pub_key, 响应: [%s]", resp_json)
-                        return None
+        pub_key = resp_json.get("data")
 
-                    _LOGGER.info("获取公钥成功: [%s...]", pub_key[:10])
-                    self._public_key = pub_key
+        if not pub_key:
+            _LOGGER.error("获取公钥失败, 未获取到 pub_key, 响应: [%s]", resp_json)
+            return None
 
-            except Exception as e:
-                _LOGGER.error("获取公钥请求异常,  错误: [%s]", str(e))
-                return None
+        _LOGGER.info("获取公钥成功: [%s...]", pub_key[:10])
+        return pub_key
 
     def _get_pub_key_pem(self):
         if not self._public_key:
@@ -160,9 +312,7 @@ class MdejAPI(object):
         }
         plaintext = json.dumps(data_to_encrypt).encode('utf-8')
 
-        pub_key_str = self._get_pub_key_pem()
-        pub_key = RSA.importKey(pub_key_str)
-        cipher = PKCS1_v1_5.new(pub_key)
+        cipher = _get_cipher(self._get_pub_key_pem())
 
         encrypted_bytes = cipher.encrypt(plaintext)
         encrypted_base64_str = base64.b64encode(encrypted_bytes).decode('utf-8')
@@ -170,130 +320,121 @@ class MdejAPI(object):
 
         return encrypted_base64_str
 
-    async def get_token(self, payload):
+    async def async_cal_payload(self, username, pwd):
+        """
+        在线程池中计算登录payload, RSA加密不阻塞事件循环
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self.cal_payload, username, pwd)
+
+    async def get_token(self, payload, public_key=None):
         """
         登录以获取 token
         这个接口不稳定, 即使是在手机上偶尔也会报500
         :param payload: 登录请求负载
+        :param public_key: 计算 payload 时使用的公钥, 为空时使用当前的公钥 (旧的配置条目没有保存公钥)
         :return: token (str)
-        :raises Exception: 登录失败时抛出异常
+        :raises MdejPublicKeyError: 公钥已更换, payload 无法解密, 此时已清除公钥缓存
+        :raises ImpcApiError: 登录失败时抛出异常
         """
+        if public_key is None:
+            public_key = await self._ensure_public_key()
         data = {
             "payLoad": payload,
-            "publicKey": self._public_key
+            "publicKey": public_key
         }
         _LOGGER.info("开始登录 app, 用户: [%s]", self._username)
         await asyncio.sleep(1)
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                        f"{BASE_APP_API_URL}/hlwyy/business-zhfw/account/loginNew3",
-                        timeout=MdejAPI.timeout,
-                        json=data,
-                        headers=MdejAPI.header
-                ) as response:
-
-                    if response.status != 200:
-                        text = await response.text()
-                        _LOGGER.error("登录失败, 用户: [%s], 状态码: [%d], 响应: [%s]", self._username, response.status, text)
-                        raise Exception(f"用户 [{self._username}] 登录失败: HTTP 状态码 {response.status}, 响应: {text}")
+        try:
+            resp_json = await self._request_json("POST", "/hlwyy/business-zhfw/account/loginNew3", MdejAPI.header,
+                                                 json=data)
 
-                    resp_json = await response.json(encoding="utf-8")
+            if resp_json.get("code") != 0:
+                _LOGGER.error("登录失败, 用户: [%s], code != 0, 响应: [%s]", self._username, resp_json)
+                if is_public_key_error(resp_json):
+                    # 下次获取公钥时重新请求
+                    _public_key_cache.invalidate()
+                    raise MdejPublicKeyError(f"用户 [{self._username}] 登录失败: 公钥已更换, 响应: {resp_json}")
+                raise ImpcApiError(f"用户 [{self._username}] 登录失败: code != 0, 响应: {resp_json}")
 
-                    if resp_json.get("code") != 0:
-                        _LOGGER.error("登录失败, 用户: [%s], code != 0, 响应: [%s]", self._username, resp_json)
-                        raise Exception(f"用户 [{self._username}] 登录失败: code != 0, 响应: {resp_json}")
+            token = (resp_json.get("data") or {}).get("token")
 
-                    token = resp_json.get("data", {}).get("token")
+            if not token:
+                _LOGGER.error("登录失败, 用户: [%s], 未获取到 token, 响应: [%s]", self._username, resp_json)
+                raise ImpcApiError(f"用户 [{self._username}] 登录失败: 未获取到 token, 响应: {resp_json}")
 
-                    if not token:
-                        _LOGGER.error("登录失败, 用户: [%s], 未获取到 token, 响应: [%s]", self._username, resp_json)
-                        raise Exception(f"用户 [{self._username}] 登录失败: 未获取到 token, 响应: {resp_json}")
-
-                    _LOGGER.info("登录成功, 用户: [%s]", self._username)
-                    self._token = token
-                    return token
+            _LOGGER.info("登录成功, 用户: [%s]", self._username)
+            self._token = token
+            return token
 
-            except Exception as e:
-                _LOGGER.error("登录请求异常, 用户: [%s], 错误: [%s]", self._username, str(e))
-                raise
+        except Exception as e:
+            _LOGGER.error("登录请求异常, 用户: [%s], 错误: [%s]", self._username, str(e))
+            raise
 
-    async def get_daily(self, days=30):
+    async def get_daily(self, days=30, account_number=None):
         """
         获取每日用电数据
-        :return:
+        :param days: 获取最近多少天的数据 (ts)
+        :param account_number: 户号, 为空时使用 set_account_number 设置的户号; 同一登录下的多个户号共用一个实例时传入
+        :return: DailySeries
         """
+        account_number = account_number or self._account_number
 
         param = {
-            "yhdabh": self._account_number,
+            "yhdabh": account_number,
             "ts": days
         }
-        _LOGGER.info("开始获取每日用电数据, 户号: [%s]", self._account_number)
-
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(
-                        f"{BASE_APP_API_URL}/hlwyy/business-ggfw/khrydl/getKfrydl",
-                        timeout=MdejAPI.timeout,
-                        params=param,
-                        headers=self.get_header_with_token()
-                ) as response:
-                    # 1. 检查 HTTP 状态码
-                    if response.status != 200:
-                        text = await response.text()
-                        _LOGGER.error("获取每日用电数据失败, 户号: [%s], 状态码: [%d], 响应: [%s]",
-                                      self._account_number, response.status, text)
-                        raise Exception(f"获取每日用电数据失败: HTTP 状态码 {response.status}, 响应: {text}")
-
-                    # 2. 解析 JSON
-                    resp_json = await response.json(encoding="utf-8")
-
-                    # 3. 检查返回 code
-                    if resp_json.get("code") != 0:
-                        _LOGGER.error("获取每日用电数据失败, 户号: [%s], code != 0, 响应: [%s]",
-                                      self._account_number, resp_json)
-                        raise Exception(f"获取每日用电数据失败: code != 0, 响应: {resp_json}")
-
-                    # 4. 获取 data
-                    data_list = resp_json.get("data")
-                    if not data_list:
-                        _LOGGER.error("获取每日用电数据失败, 户号: [%s], 未获取到数据, 响应: [%s]",
-                                      self._account_number, resp_json)
-                        raise Exception(f"获取每日用电数据失败: 未获取到数据, 响应: {resp_json}")
-
-                    _LOGGER.debug("开始处理每日用电数据")
-                    transformed_data = []
-                    for item in data_list:
-                        # 原始日期字符串，例如 "2025/02/13"
-                        rq = item.get("rq", "")
-                        # 原始用电量字符串，例如 "18.25"
-                        dl_str = item.get("dl", "0")
-
-                        # 1. 解析日期，将 "YYYY/MM/DD" 转成 "YYYY-MM-DD"
-                        try:
-                            date_obj = datetime.datetime.strptime(rq, "%Y/%m/%d")
-                            date_str = date_obj.strftime("%Y-%m-%d")
-                        except ValueError:
-                            # 如果日期格式有问题，可以根据实际情况做异常处理或默认值
-                            date_str = rq  # 或者 continue、或 log 输出
-
-                        # 2. 将用电量转换为浮点数
-                        try:
-                            consumption_val = float(dl_str)
-                        except ValueError:
-                            # 如果转换失败，也可以根据需要处理
-                            consumption_val = 0.0
-
-                        transformed_data.append({
-                            ATTR_DATE: date_str,
-                            ATTR_CONSUMPTION: consumption_val
-                        })
-
-                    _LOGGER.info("获取到每日用电数据, 户号: [%s], data: [%s]", self._account_number, transformed_data)
-                    return transformed_data
-
-            except Exception as e:
-                _LOGGER.error("获取每日用电数据请求异常, 户号: [%s], 错误: [%s]",
-                              self._account_number, str(e))
+        _LOGGER.info("开始获取每日用电数据, 户号: [%s]", account_number)
+
+        try:
+            resp_json = await self._request_json("GET", "/hlwyy/business-ggfw/khrydl/getKfrydl",
+                                                 self.get_header_with_token(), params=param)
+
+            # 1. 检查返回 code
+            if is_auth_error(resp_json):
+                raise MdejAuthError(f"token 无效, 户号: [{account_number}], 响应: {resp_json}")
+
+            if resp_json.get("code") != 0:
+                _LOGGER.error("获取每日用电数据失败, 户号: [%s], code != 0, 响应: [%s]",
+                              account_number, resp_json)
+                raise ImpcApiError(f"获取每日用电数据失败: code != 0, 响应: {resp_json}")
+
+            # 2. 获取 data
+            data_list = resp_json.get("data")
+            if not data_list:
+                _LOGGER.error("获取每日用电数据失败, 户号: [%s], 未获取到数据, 响应: [%s]",
+                              account_number, resp_json)
+                raise ImpcApiError(f"获取每日用电数据失败: 未获取到数据, 响应: {resp_json}")
+
+            _LOGGER.debug("开始处理每日用电数据")
+            with trace_span("transform", items=len(data_list)):
+                series = DailySeries()
+                for item in data_list:
+                    # 原始日期字符串，例如 "2025/02/13"
+                    rq = item.get("rq", "")
+                    # 原始用电量字符串，例如 "18.25"
+                    dl_str = item.get("dl", "0")
+
+                    # 1. 解析日期 "YYYY/MM/DD", 格式有问题的跳过
+                    try:
+                        date = datetime.datetime.strptime(rq, "%Y/%m/%d").date()
+                    except ValueError:
+                        _LOGGER.warning("每日用电数据日期格式错误, 户号: [%s], 日期: [%s]", account_number, rq)
+                        continue
+
+                    # 2. 将用电量转换为浮点数
+                    try:
+                        consumption_val = float(dl_str)
+                    except ValueError:
+                        # 如果转换失败，也可以根据需要处理
+                        consumption_val = 0.0
+
+                    series.set(date, **{ATTR_CONSUMPTION: consumption_val})
+
+            _LOGGER.info("获取到每日用电数据, 户号: [%s], data: [%s]", account_number, series)
+            return series
+
+        except Exception as e:
+            _LOGGER.error("获取每日用电数据请求异常, 户号: [%s], 错误: [%s]",
+                          account_number, str(e))
             raise
@@ -0,0 +1,115 @@
+# 接口调用统计
+
+import collections
+import contextlib
+import datetime
+import time
+
+from typing import Deque, Dict, Optional
+
+from .const import (
+    METRICS_SAMPLE_SIZE
+)
+
+tz = datetime.timezone(datetime.timedelta(hours=+8))
+
+
+class EndpointMetrics(object):
+    """
+    单个接口的统计
+    请求 (request) 指一次 HTTP 请求; 调用 (call) 指一次完整的调用, 可能包含多次重试
+    延迟只统计最近 sample_size 次请求, 不包括在限速器中等待的时间
+    """
+
+    def __init__(self, endpoint: str, sample_size: int = METRICS_SAMPLE_SIZE):
+        self.endpoint = endpoint
+        self.requests = 0
+        self.request_errors = 0
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.last_success: Optional[datetime.datetime] = None
+        self.last_failure: Optional[datetime.datetime] = None
+        self.last_error: Optional[str] = None
+        self._latencies: Deque[float] = collections.deque(maxlen=sample_size)
+
+    def record_request(self, latency: float, error: Optional[BaseException] = None):
+        self.requests += 1
+        self._latencies.append(latency)
+        if error is not None:
+            self.request_errors += 1
+
+    def record_retry(self):
+        self.retries += 1
+
+    def record_call(self, error: Optional[BaseException] = None):
+        self.calls += 1
+        now = datetime.datetime.now(tz)
+        if error is None:
+            self.last_success = now
+        else:
+            self.failures += 1
+            self.last_failure = now
+            # 错误信息中可能包含响应内容 (token 等), 只记录异常类型
+            self.last_error = type(error).__name__
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        延迟的百分位数 (秒), 没有样本时为 None
+        :param p: [0, 1]
+        """
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+    def as_dict(self) -> dict:
+        def _ms(seconds: Optional[float]) -> Optional[float]:
+            return round(seconds * 1000, 1) if seconds is not None else None
+
+        return {
+            "requests": self.requests,
+            "request_errors": self.request_errors,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "latency_p50_ms": _ms(self.percentile(0.5)),
+            "latency_p95_ms": _ms(self.percentile(0.95)),
+            "latency_max_ms": _ms(max(self._latencies, default=None)),
+            "last_success": self.last_success.isoformat() if self.last_success else None,
+            "last_failure": self.last_failure.isoformat() if self.last_failure else None,
+            "last_error": self.last_error,
+        }
+
+
+class ApiMetrics(object):
+    """
+    按接口统计请求次数, 失败, 重试与延迟
+    每个 EnergyAPI / MdejAPI 实例一份; 同一蒙电e家用户名下的户号共用 MdejAPI, 因此也共用其统计
+    """
+
+    def __init__(self, sample_size: int = METRICS_SAMPLE_SIZE):
+        self._sample_size = sample_size
+        self._endpoints: Dict[str, EndpointMetrics] = {}
+
+    def get(self, endpoint: str) -> EndpointMetrics:
+        metrics = self._endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self._endpoints[endpoint] = EndpointMetrics(endpoint, self._sample_size)
+        return metrics
+
+    @contextlib.contextmanager
+    def measure(self, endpoint: str):
+        """
+        统计一次请求的耗时
+        """
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.get(endpoint).record_request(time.monotonic() - start, e)
+            raise
+        self.get(endpoint).record_request(time.monotonic() - start)
+
+    def as_dict(self) -> dict:
+        return {endpoint: metrics.as_dict() for endpoint, metrics in sorted(self._endpoints.items())}
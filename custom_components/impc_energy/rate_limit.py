@@ -0,0 +1,123 @@
+# 请求限速
+
+import asyncio
+import contextlib
+import logging
+import time
+
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from .const import (
+    DOMAIN,
+    DATA_LIMITER,
+    DEFAULT_RATE_LIMIT,
+    HOST_RATE_LIMITS
+)
+
+# 限速参数 (每秒请求数, 突发容量, 最大并发请求数)
+RateLimit = Tuple[float, float, int]
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    """
+    令牌桶
+    以 rate 个/秒 的速度补充令牌, 最多积累 capacity 个, 每个请求消耗一个令牌
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate 必须大于0, capacity 必须不小于1")
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @property
+    def capacity(self) -> float:
+        return self._capacity
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        """
+        获取一个令牌, 令牌不足时等待
+        持有锁期间等待, 保证先到先得
+        """
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                wait = (1 - self._tokens) / self._rate
+                _LOGGER.debug("令牌不足, 等待 [%.2f] 秒", wait)
+                await asyncio.sleep(wait)
+                self._refill()
+            self._tokens -= 1
+
+
+class HostRateLimiter(object):
+    """
+    按主机限速
+    每个主机一个令牌桶与一个并发信号量, 限速参数可通过 limits 按主机配置, 未配置的主机使用 default
+    在 Home Assistant 中所有配置条目共用 hass.data[DOMAIN] 中的同一个实例
+    """
+
+    def __init__(self, limits: Optional[Dict[str, RateLimit]] = None,
+                 default: RateLimit = DEFAULT_RATE_LIMIT):
+        self._limits = {**HOST_RATE_LIMITS, **(limits or {})}
+        self._default = default
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @staticmethod
+    def _get_host(url: str) -> str:
+        return urlparse(url).hostname or url
+
+    def _get_limit(self, host: str) -> RateLimit:
+        return self._limits.get(host, self._default)
+
+    def get_bucket(self, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, capacity, _ = self._get_limit(host)
+            bucket = self._buckets[host] = TokenBucket(rate, capacity)
+        return bucket
+
+    def get_semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            _, _, max_in_flight = self._get_limit(host)
+            semaphore = self._semaphores[host] = asyncio.Semaphore(max_in_flight)
+        return semaphore
+
+    @contextlib.asynccontextmanager
+    async def request(self, url: str):
+        """
+        包裹一次请求: 占用一个并发名额并消耗一个令牌, 请求结束后释放并发名额
+
+        async with limiter.request(url):
+            async with session.get(url) as response:
+                ...
+
+        :param url: 完整url或主机名
+        """
+        host = self._get_host(url)
+        async with self.get_semaphore(host):
+            await self.get_bucket(host).acquire()
+            yield
+
+
+def get_shared_limiter(hass) -> HostRateLimiter:
+    """
+    Home Assistant 中所有条目及配置流程共用的限速器, 不存在时创建
+    """
+    return hass.data.setdefault(DOMAIN, {}).setdefault(DATA_LIMITER, HostRateLimiter())
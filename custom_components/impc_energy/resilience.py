@@ -0,0 +1,175 @@
+# 重试与熔断
+
+import asyncio
+import logging
+import random
+import time
+
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .const import (
+    RETRY_POLICIES,
+    DEFAULT_RETRY_POLICY,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RECOVERY_TIME
+)
+from .exceptions import CircuitOpenError, ImpcServerError
+from .metrics import ApiMetrics
+from .tracing import trace_span
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 可以重试的异常: 网络错误, 超时, 服务器错误
+RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ImpcServerError)
+
+
+class RetryPolicy(object):
+    """
+    重试策略
+    第 n 次重试前等待 min(max_delay, base_delay * 2^(n-1)) 秒, 并加入随机抖动 (full jitter)
+    """
+
+    def __init__(self, attempts: int, base_delay: float, max_delay: float):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def get_delay(self, retry: int) -> float:
+        """
+        :param retry: 第几次重试, 从1开始
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+
+def get_endpoint_name(path: str) -> str:
+    """
+    接口名, 取路径的最后两段
+    例如 /api/hlwyy/business-jffw/dldf/zztList -> dldf/zztList
+    """
+    return "/".join(path.rstrip("/").split("/")[-2:])
+
+
+def get_retry_policy(endpoint: str) -> RetryPolicy:
+    return RetryPolicy(*RETRY_POLICIES.get(endpoint, DEFAULT_RETRY_POLICY))
+
+
+class CircuitBreaker(object):
+    """
+    熔断器
+    连续失败 failure_threshold 次后打开, recovery_time 秒内的请求直接失败;
+    之后放行一个试探请求 (半开), 成功则关闭, 失败则重新打开
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_time: float = CIRCUIT_RECOVERY_TIME):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._recovery_time = recovery_time
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def before_call(self):
+        """
+        请求前调用, 熔断中抛出 CircuitOpenError
+        """
+        if self._opened_at is None:
+            return
+        if time.monotonic() - self._opened_at < self._recovery_time or self._probing:
+            raise CircuitOpenError(f"主机 [{self.name}] 熔断中, 暂停请求")
+        # 半开: 放行一个试探请求
+        self._probing = True
+
+    def record_success(self):
+        if self._opened_at is not None:
+            _LOGGER.info("主机 [%s] 恢复, 关闭熔断", self.name)
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def release_probe(self):
+        """
+        试探请求被取消 (如重新加载, 外层超时) 时调用
+        不能说明主机的状态, 只释放试探名额, 下一个请求可以重新试探
+        """
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._probing or self._failures >= self._failure_threshold:
+            if self._opened_at is None or self._probing:
+                _LOGGER.warning("主机 [%s] 连续失败 [%d] 次, 打开熔断 [%d] 秒",
+                                self.name, self._failures, self._recovery_time)
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(url: str) -> CircuitBreaker:
+    """
+    按主机获取熔断器, 所有实例共用
+    :param url: 完整url或主机名
+    """
+    host = urlparse(url).hostname or url
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker(host)
+    return breaker
+
+
+async def call_with_retry(func: Callable[[], Awaitable[T]], endpoint: str, url: str,
+                          policy: Optional[RetryPolicy] = None, metrics: Optional[ApiMetrics] = None) -> T:
+    """
+    按接口的重试策略调用, 并经过主机的熔断器
+    只有网络错误, 超时与服务器错误会重试; 其他异常 (如 token 失效, 返回数据错误) 直接抛出
+
+    :param func: 发起一次请求的协程函数
+    :param endpoint: 接口名, 用于选择重试策略
+    :param url: 请求地址, 用于选择熔断器
+    :param metrics: 记录调用结果与重试次数
+    """
+    policy = policy or get_retry_policy(endpoint)
+    breaker = get_breaker(url)
+    endpoint_metrics = (metrics or ApiMetrics()).get(endpoint)
+
+    attempt = 1
+    while True:
+        try:
+            breaker.before_call()
+            try:
+                result = await func()
+            except RETRYABLE_ERRORS as e:
+                breaker.record_failure()
+                if attempt >= policy.attempts or breaker.is_open:
+                    raise
+                delay = policy.get_delay(attempt)
+                _LOGGER.warning("请求 [%s] 失败, [%.1f] 秒后第 [%d] 次重试, 错误: [%r]", endpoint, delay, attempt, e)
+                endpoint_metrics.record_retry()
+                with trace_span("retry_wait", attempt=attempt):
+                    await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except Exception:
+                # 服务器有响应, 主机可用
+                breaker.record_success()
+                raise
+            except BaseException:
+                breaker.release_probe()
+                raise
+        except Exception as e:
+            endpoint_metrics.record_call(e)
+            raise
+        breaker.record_success()
+        endpoint_metrics.record_call()
+        return result
@@ -0,0 +1,249 @@
+# 自适应轮询
+
+import calendar
+import datetime
+import hashlib
+import logging
+
+from typing import Dict, Iterable, List, Optional, Set
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    DOMAIN,
+    ATTR_BALANCE,
+    ATTR_HISTORY,
+    SCHEDULE_POLICIES,
+    SCHEDULE_MAX_CHANGES,
+    SCHEDULE_MIN_INTERVAL
+)
+
+_LOGGER = logging.getLogger(__name__)
+tz = datetime.timezone(datetime.timedelta(hours=+8))
+
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10
+
+# 余额与历史数据按月结算, 按"几号"学习; 每日数据按"几点"出数学习
+MONTHLY_SOURCES = (ATTR_BALANCE, ATTR_HISTORY)
+# 定时器可能略早触发, 判断是否到期时留出余量
+DUE_TOLERANCE = datetime.timedelta(minutes=1)
+
+
+class SourceSchedule(object):
+    """
+    单个数据源的轮询计划
+    记录数据变化的时间, 据此推算下一次可能变化的时间窗口; 窗口内密集轮询, 窗口外稀疏轮询
+    """
+
+    def __init__(self, source: str, dense: datetime.timedelta, sparse: datetime.timedelta,
+                 default_marks: Iterable[int]):
+        self.source = source
+        self.dense = dense
+        self.sparse = sparse
+        self._default_marks = set(default_marks)
+        self.changes: List[datetime.datetime] = []
+        self.fingerprint: Optional[str] = None
+        self.next_due: Optional[datetime.datetime] = None
+
+    @property
+    def _unit(self) -> datetime.timedelta:
+        return datetime.timedelta(days=1) if self.source in MONTHLY_SOURCES else datetime.timedelta(hours=1)
+
+    def _mark(self, t: datetime.datetime) -> int:
+        """时间在周期中的位置: 月度数据为几号, 每日数据为几点"""
+        t = t.astimezone(tz)
+        return t.day if self.source in MONTHLY_SOURCES else t.hour
+
+    def _window_marks(self) -> Set[int]:
+        """
+        学习到的可能发生变化的位置
+        没有记录时使用默认值
+        """
+        return {self._mark(t) for t in self.changes} or self._default_marks
+
+    def _matches(self, t: datetime.datetime, marks: Set[int]) -> bool:
+        """
+        t 是否处于 marks 中的某个位置
+        月度数据的位置超过当月天数时按月末计算 (如31号在小月为30号)
+        """
+        mark = self._mark(t)
+        if self.source in MONTHLY_SOURCES:
+            t = t.astimezone(tz)
+            last_day = calendar.monthrange(t.year, t.month)[1]
+            marks = {min(m, last_day) for m in marks}
+        return mark in marks
+
+    def in_window(self, t: datetime.datetime) -> bool:
+        """
+        t 是否处于可能变化的窗口内: 学习到的位置及其前后一格
+        前后一格按时间计算, 可以跨越月末/午夜 (如1号的前一格为上月最后一天)
+        本窗口内已经发生过变化时不再视为窗口内
+        """
+        marks = self._window_marks()
+        if not any(self._matches(t + self._unit * offset, marks) for offset in (-1, 0, 1)):
+            return False
+        if self.changes and t - self.changes[-1] < self._unit * 3:
+            return False
+        return True
+
+    def is_due(self, now: datetime.datetime) -> bool:
+        return self.next_due is None or now + DUE_TOLERANCE >= self.next_due
+
+    def record(self, now: datetime.datetime, data_fingerprint: Optional[str]):
+        """
+        记录一次成功的轮询, 并计算下一次轮询时间
+        :param data_fingerprint: 本次数据的指纹, 与上次不同时记为一次变化
+        """
+        if self.fingerprint is not None and data_fingerprint != self.fingerprint:
+            self.changes.append(now)
+            self.changes = self.changes[-SCHEDULE_MAX_CHANGES:]
+            _LOGGER.debug("数据源 [%s] 数据变化, 时间: [%s]", self.source, now)
+        self.fingerprint = data_fingerprint
+        self.next_due = now + self.next_interval(now)
+
+    def record_failure(self, now: datetime.datetime):
+        """轮询失败时按密集间隔重试"""
+        self.next_due = now + self.dense
+
+    def next_interval(self, now: datetime.datetime) -> datetime.timedelta:
+        """
+        窗口内使用密集间隔; 窗口外使用稀疏间隔, 但不晚于下一个窗口的开始
+        """
+        if self.in_window(now):
+            return self.dense
+
+        step = datetime.timedelta(hours=1)
+        delay = step
+        while delay < self.sparse:
+            if self.in_window(now + delay):
+                # 对齐到窗口开始的整点
+                t = (now + delay).replace(minute=0, second=0, microsecond=0)
+                return max(t - now, self.dense)
+            delay += step
+        return self.sparse
+
+    def as_dict(self) -> dict:
+        return {
+            "changes": [t.isoformat() for t in self.changes],
+            "fingerprint": self.fingerprint,
+            "next_due": self.next_due.isoformat() if self.next_due else None,
+        }
+
+    def load_dict(self, data: dict):
+        self.changes = [datetime.datetime.fromisoformat(t) for t in data.get("changes", [])]
+        self.fingerprint = data.get("fingerprint")
+        # 重启后未到期的数据源不必立即请求
+        next_due = data.get("next_due")
+        self.next_due = datetime.datetime.fromisoformat(next_due) if next_due else None
+
+
+class AdaptiveScheduler(object):
+    """
+    按数据源学习更新规律的轮询调度
+    每个户号一个, 变化记录持久化保存, 重启后继续使用
+    """
+
+    def __init__(self, hass: HomeAssistant, account_number: str, sources: Iterable[str]):
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.schedule_{account_number}")
+        self._sources: Dict[str, SourceSchedule] = {}
+        for source in sources:
+            dense, sparse, default_marks = SCHEDULE_POLICIES[source]
+            self._sources[source] = SourceSchedule(source, dense, sparse, default_marks)
+
+    async def async_load(self):
+        data = await self._store.async_load() or {}
+        for source, schedule in self._sources.items():
+            schedule.load_dict(data.get(source, {}))
+
+    def _save(self):
+        self._store.async_delay_save(
+            lambda: {source: schedule.as_dict() for source, schedule in self._sources.items()},
+            STORAGE_SAVE_DELAY
+        )
+
+    def due_sources(self, now: datetime.datetime) -> List[str]:
+        return [source for source, schedule in self._sources.items() if schedule.is_due(now)]
+
+    def mark_due(self, source: str):
+        if source in self._sources:
+            self._sources[source].next_due = None
+
+    def record(self, source: str, now: datetime.datetime, data_fingerprint: Optional[str]):
+        self._sources[source].record(now, data_fingerprint)
+        self._save()
+
+    def record_failure(self, source: str, now: datetime.datetime):
+        self._sources[source].record_failure(now)
+        self._save()
+
+    @property
+    def phase_period(self) -> datetime.timedelta:
+        """错开相位的周期, 取各数据源中最短的密集间隔"""
+        return min(schedule.dense for schedule in self._sources.values())
+
+    def next_delay(self, now: datetime.datetime) -> datetime.timedelta:
+        """
+        距离最早一个数据源到期的时间
+        """
+        dues = [schedule.next_due for schedule in self._sources.values() if schedule.next_due is not None]
+        if not dues:
+            return SCHEDULE_MIN_INTERVAL
+        return max(min(dues) - now, SCHEDULE_MIN_INTERVAL)
+
+    async def async_remove(self):
+        await self._store.async_remove()
+
+
+def align_to_phase(target: datetime.datetime, period: datetime.timedelta, fraction: float) -> datetime.datetime:
+    """
+    将时间推迟到该户号在周期内的相位上
+    返回不早于 target, 且满足 (t - fraction * period) 为 period 整数倍的最早时间
+
+    :param fraction: 相位, [0, 1)
+    """
+    period_seconds = period.total_seconds()
+    offset = fraction * period_seconds
+    shift = (offset - target.timestamp()) % period_seconds
+    return target + datetime.timedelta(seconds=shift)
+
+
+class PhaseAllocator(object):
+    """
+    为各户号分配轮询相位
+    按户号哈希排序后均匀分布在 [0, 1) 上, 结果与条目添加顺序无关; 增删条目后自动重新均分
+    所有条目共用 hass.data[DOMAIN] 中的同一个实例
+    """
+
+    def __init__(self):
+        self._accounts: Set[str] = set()
+        self._fractions: Dict[str, float] = {}
+
+    @staticmethod
+    def _hash(account_number: str) -> int:
+        return int(hashlib.sha1(str(account_number).encode("utf-8")).hexdigest(), 16)
+
+    def _rebalance(self):
+        ordered = sorted(self._accounts, key=self._hash)
+        self._fractions = {account: index / len(ordered) for index, account in enumerate(ordered)}
+        _LOGGER.debug("重新分配轮询相位, 户号数: [%d]", len(ordered))
+
+    def register(self, account_number: str):
+        self._accounts.add(account_number)
+        self._rebalance()
+
+    def unregister(self, account_number: str):
+        self._accounts.discard(account_number)
+        self._rebalance()
+
+    def fraction(self, account_number: str) -> float:
+        return self._fractions.get(account_number, 0.0)
+
+    @classmethod
+    def hash_fraction(cls, account_number: str) -> float:
+        """
+        只由户号哈希决定的 [0, 1) 上的位置, 与已注册的户号无关
+        用于启动时: 条目依次加载, 此时的均分结果还会随后续条目的注册而变化
+        """
+        return cls._hash(account_number) % 10000 / 10000
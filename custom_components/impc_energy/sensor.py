@@ -5,16 +5,26 @@ import logging
 from datetime import timedelta
 from typing import Any, Dict, Optional
 
-import aiohttp
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfTime
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.core import (
-    HomeAssistant
+    HomeAssistant,
+    callback
 )
+from .coordinator import ImpcDataUpdateCoordinator, fingerprint
+from .scheduler import AdaptiveScheduler, PhaseAllocator
+from .series import DailySeries
 from .energy_api import EnergyAPI
-from .mdej_api import MdejAPI
+from .metrics import ApiMetrics
+from .statistics import get_statistic_id
+from .store import DailyStore, HistoryStore
+from .tariff import estimate_bill
 
 from .const import (
     DOMAIN,
@@ -22,15 +32,35 @@ from .const import (
     ATTR_ACCOUNT_NUMBER,
     ATTR_BALANCE,
     ATTR_BILL,
+    ATTR_CATEGORY,
     ATTR_CONSUMPTION,
     ATTR_CURRENT,
     ATTR_DAILY,
+    ATTR_DAILY_AVERAGE,
     ATTR_DATE,
+    ATTR_DAYS,
     ATTR_DESC,
     ATTR_HISTORY,
+    ATTR_LAST_QUERY,
+    ATTR_LOGIN_PAYLOAD,
     ATTR_MONTH,
+    ATTR_MONTH_TO_DATE,
+    ATTR_PRICE,
+    ATTR_PROJECTED,
+    ATTR_PUBLIC_KEY,
+    ATTR_STATISTIC_ID,
+    ATTR_TIER,
     ATTR_TOKEN,
+    ATTR_TRACE,
     ATTR_USERNAME,
+    DAILY_AVERAGE_DAYS,
+    DATA_COORDINATOR,
+    DATA_LIMITER,
+    DATA_MDEJ_CLIENTS,
+    DATA_PHASES,
+    METRICS_ENERGY_ENDPOINTS,
+    METRICS_MDEJ_ENDPOINTS,
+    STARTUP_REFRESH_SPREAD,
     UNIT_CURRENCY_YUAN,
     UNIT_KILOWATT_HOUR,
 )
@@ -39,8 +69,18 @@ tz = datetime.timezone(timedelta(hours=+8))
 
 _LOGGER = logging.getLogger(__name__)
 
-# Time between updating data
-SCAN_INTERVAL = timedelta(hours=8)
+# 由每日数据派生的传感器 {键: (名称, 图标)}
+DAILY_AGGREGATE_SENSORS = {
+    ATTR_MONTH_TO_DATE: ("本月电量", "mdi:calendar-month"),
+    ATTR_DAILY_AVERAGE: (f"近{DAILY_AVERAGE_DAYS}日日均电量", "mdi:chart-line"),
+    ATTR_PROJECTED: ("本月预计电量", "mdi:chart-timeline-variant"),
+}
+
+# 按阶梯电价估算的传感器 {键: (名称, 图标)}
+ESTIMATE_SENSORS = {
+    ATTR_BILL: ("本月预估电费", "mdi:cash-clock"),
+    ATTR_BALANCE: ("预估余额", "mdi:cash-minus"),
+}
 
 
 async def async_setup_entry(
@@ -62,49 +102,178 @@ async def async_setup_entry(
 
     # 创建 EnergyAPI 实例
     session = async_get_clientsession(hass)
-    energy_api = EnergyAPI(session, account_number)
+    history_store = HistoryStore(hass, account_number)
+    await history_store.async_load()
+    limiter = hass.data[DOMAIN][DATA_LIMITER]
+    energy_api = EnergyAPI(session, account_number, limiter=limiter, history_store=history_store)
     energy_api.set_account_name(account_name)
 
     # 获取app信息
     app_username = data.get(ATTR_USERNAME)
     app_token = data.get(ATTR_TOKEN)
-    # 创建 MdejAPI 实例
+    # 获取 MdejAPI 实例, 同一用户名下的户号共用一个已登录的客户端
     mdej_api = None
+    token_manager = None
+    daily_store = None
     if app_username and app_token:
-        mdej_api = MdejAPI(app_username)
-        await mdej_api.initialize(token=app_token)
-        mdej_api.set_account_number(account_number)
-        mdej_api.set_account_name(account_name)
+        registry = hass.data[DOMAIN][DATA_MDEJ_CLIENTS]
+        client = await registry.async_acquire(entry, app_username, app_token, data.get(ATTR_LOGIN_PAYLOAD),
+                                              data.get(ATTR_PUBLIC_KEY))
+        entry.async_on_unload(lambda: registry.async_release(app_username, entry.entry_id))
+        mdej_api = client.api
+        token_manager = client.token_manager
+
+        daily_store = DailyStore(hass, account_number)
+        await daily_store.async_load()
+
+    # 按各数据源的更新规律安排轮询
+    sources = [ATTR_BALANCE, ATTR_HISTORY] + ([ATTR_DAILY] if mdej_api else [])
+    scheduler = AdaptiveScheduler(hass, account_number, sources)
+    await scheduler.async_load()
+
+    # 同一户号的所有实体共享一个协调器, 每个更新周期只请求一次上游
+    phases = hass.data[DOMAIN][DATA_PHASES]
+    coordinator = ImpcDataUpdateCoordinator(hass, energy_api, mdej_api, token_manager, daily_store, scheduler, phases,
+                                            trace=entry.options.get(ATTR_TRACE, False))
+    data[DATA_COORDINATOR] = coordinator
+
+    # 实体先恢复上次的状态, 首次刷新在后台进行, 不阻塞启动
+    sensors = await get_sensors(coordinator)
+    async_add_entities(sensors)
 
-    sensors = await get_sensors(energy_api, mdej_api)
-    async_add_entities(sensors, update_before_add=True)
+    async def _async_first_refresh(_now):
+        await coordinator.async_refresh()
 
+    # 按户号哈希错开各户号的首次刷新; 其他条目可能还在加载, 不使用按户号数均分的相位
+    delay = PhaseAllocator.hash_fraction(account_number) * STARTUP_REFRESH_SPREAD.total_seconds()
+    _LOGGER.debug("户号: [%s], [%.1f] 秒后首次刷新", account_number, delay)
+    entry.async_on_unload(async_call_later(hass, delay, _async_first_refresh))
 
-async def get_sensors(energy_api: EnergyAPI, mdej_api: MdejAPI):
+
+async def get_sensors(coordinator: ImpcDataUpdateCoordinator):
     sensors = []
 
     # 公众号数据传感器
-    sensors.append(ImpcBalanceSensor(energy_api))
-    sensors.append(ImpcHistorySensor(energy_api))
+    sensors.append(ImpcBalanceSensor(coordinator))
+    sensors.append(ImpcHistorySensor(coordinator))
 
-    if mdej_api:
+    if coordinator.mdej_api:
         # 蒙电e家传感器
-        sensors.append(MdejDailySensor(mdej_api))
+        sensors.append(MdejDailySensor(coordinator))
+        if coordinator.daily_store is not None:
+            for key in DAILY_AGGREGATE_SENSORS:
+                sensors.append(MdejDailyAggregateSensor(coordinator, key))
+            for key in ESTIMATE_SENSORS:
+                sensors.append(ImpcEstimateSensor(coordinator, key))
+
+    # 诊断传感器
+    sensors.append(ImpcLastQuerySensor(coordinator))
+    for endpoint in METRICS_ENERGY_ENDPOINTS:
+        sensors.append(ImpcEndpointLatencySensor(coordinator, coordinator.energy_api.metrics, endpoint))
+    if coordinator.mdej_api:
+        for endpoint in METRICS_MDEJ_ENDPOINTS:
+            sensors.append(ImpcEndpointLatencySensor(coordinator, coordinator.mdej_api.metrics, endpoint))
 
     return sensors
 
 
-class ImpcBalanceSensor(Entity):
-    def __init__(self, energy_api: EnergyAPI):
-        super().__init__()
+class ImpcCoordinatorSensor(CoordinatorEntity, RestoreEntity):
+    """
+    从协调器获取数据的传感器基类
+    子类通过 _data_key 指定使用协调器数据中的哪一部分, 并实现 _update_from_data
+    协调器还没有数据时恢复上次的状态, 及 _restore_attributes 中列出的属性
+    """
 
-        self._energy_api = energy_api
-        self._name = f"电费余额_{energy_api.account_name}"
-        self._attr_unique_id = f"{DOMAIN}_{self._energy_api.account_number}_{ATTR_BALANCE}"
-        self.entity_id = f"sensor.{self._attr_unique_id}"
+    _data_key = None
+    _restore_attributes = ()
+
+    def __init__(self, coordinator: ImpcDataUpdateCoordinator):
+        super().__init__(coordinator)
         self._state = None
-        self._available = False
         self._data = None
+        self._fingerprint = None
+        self._last_available = None
+
+    @property
+    def available(self) -> bool:
+        return super().available and self._state is not None
+
+    @property
+    def state(self) -> Optional[float]:
+        return self._state
+
+    def _get_coordinator_data(self):
+        if not self.coordinator.data:
+            return None
+        return self.coordinator.data.get(self._data_key)
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        # 协调器可能在实体添加前已完成首次刷新
+        if not self._refresh_from_coordinator():
+            await self._async_restore_state()
+
+    async def _async_restore_state(self) -> None:
+        last_state = await self.async_get_last_state()
+        try:
+            self._state = float(last_state.state)
+        except (AttributeError, ValueError):
+            # 没有可恢复的状态时, 首次刷新不论是否到期都获取该数据源
+            self.coordinator.mark_due(self._data_key)
+            return
+
+        restored = {key: last_state.attributes[key] for key in self._restore_attributes if key in last_state.attributes}
+        if restored:
+            self._attrs = {**(self._attrs or {}), **restored}
+        _LOGGER.debug("恢复状态, 实体: [%s], 状态: [%s]", self._attr_unique_id, self._state)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        changed = self._refresh_from_coordinator()
+        available = self.available
+
+        # 数据与可用性都没有变化时不写入状态, 避免产生重复的记录
+        if not changed and available == self._last_available:
+            return
+        self._last_available = available
+        self.async_write_ha_state()
+
+    def _refresh_from_coordinator(self) -> bool:
+        """
+        使用协调器的数据更新状态
+        :return: 数据是否有变化
+        """
+        data = self._get_coordinator_data()
+        if data is None:
+            return False
+
+        data_fingerprint = fingerprint(data)
+        if data_fingerprint == self._fingerprint:
+            return False
+
+        try:
+            self._update_from_data(data)
+        except (KeyError, IndexError, TypeError, ValueError):
+            _LOGGER.exception("处理数据失败, 实体: [%s]", self._attr_unique_id)
+            return False
+
+        self._fingerprint = data_fingerprint
+        return True
+
+    def _update_from_data(self, data) -> None:
+        raise NotImplementedError
+
+
+class ImpcBalanceSensor(ImpcCoordinatorSensor):
+    _data_key = ATTR_BALANCE
+
+    def __init__(self, coordinator: ImpcDataUpdateCoordinator):
+        super().__init__(coordinator)
+
+        energy_api = coordinator.energy_api
+        self._name = f"电费余额_{energy_api.account_name}"
+        self._attr_unique_id = f"{DOMAIN}_{energy_api.account_number}_{ATTR_BALANCE}"
+        self.entity_id = f"sensor.{self._attr_unique_id}"
         self._attrs: Dict[str, Any] = {
             ATTR_ACCOUNT_NAME: energy_api.account_name,
             ATTR_ACCOUNT_NUMBER: energy_api.account_number,
@@ -122,18 +291,10 @@ class ImpcBalanceSensor(Entity):
         # 使用 account_number 生成唯一标识符
         return self._attr_unique_id
 
-    @property
-    def available(self) -> bool:
-        return self._available
-
     @property
     def icon(self):
         return "hass:cash-100"
 
-    @property
-    def state(self) -> Optional[float]:
-        return self._state
-
     @property
     def data(self) -> Optional[float]:
         return self._data
@@ -146,30 +307,22 @@ class ImpcBalanceSensor(Entity):
     def extra_state_attributes(self) -> Dict[str, Any]:
         return self._attrs
 
-    async def async_update(self):
-        try:
-
-            basic_data = await self._energy_api.get_basic_new()
-            self._state = self._data = basic_data[ATTR_BALANCE]
-            self._attrs["last_query"] = datetime.datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S")
-            self._available = True
+    def _update_from_data(self, basic_data) -> None:
+        self._state = self._data = basic_data[ATTR_BALANCE]
+        self._attrs[ATTR_CATEGORY] = basic_data.get(ATTR_CATEGORY)
 
-        except aiohttp.ClientError:
-            self._available = False
-            _LOGGER.exception("Error retrieving data from IMPC.")
 
+class ImpcHistorySensor(ImpcCoordinatorSensor):
+    _data_key = ATTR_HISTORY
+    _restore_attributes = (ATTR_CURRENT, ATTR_STATISTIC_ID)
 
-class ImpcHistorySensor(Entity):
-    def __init__(self, energy_api: EnergyAPI):
-        super().__init__()
+    def __init__(self, coordinator: ImpcDataUpdateCoordinator):
+        super().__init__(coordinator)
 
-        self._energy_api = energy_api
+        energy_api = coordinator.energy_api
         self._name = f"历史电费_{energy_api.account_name}"
-        self._attr_unique_id = f"{DOMAIN}_{self._energy_api.account_number}_{ATTR_HISTORY}"
+        self._attr_unique_id = f"{DOMAIN}_{energy_api.account_number}_{ATTR_HISTORY}"
         self.entity_id = f"sensor.{self._attr_unique_id}"
-        self._state = None
-        self._available = False
-        self._data = None
         self._attrs = None
 
         _LOGGER.debug(f"ImpcHistorySensor unique id: {self._attr_unique_id}")
@@ -183,10 +336,6 @@ class ImpcHistorySensor(Entity):
         # 使用 account_number 生成唯一标识符
         return self._attr_unique_id
 
-    @property
-    def available(self) -> bool:
-        return self._available
-
     @property
     def state(self) -> Optional[float]:
         return self._state
@@ -203,42 +352,33 @@ class ImpcHistorySensor(Entity):
     def extra_state_attributes(self) -> Dict[str, Any]:
         return self._attrs
 
-    async def async_update(self):
-        try:
-
-            history_data = await self._energy_api.get_history_data()
-            self._attrs = {}
-            for item in history_data[ATTR_HISTORY]:
-                self._attrs[item[ATTR_MONTH]] = {
-                    ATTR_BILL: item[ATTR_BILL],
-                    ATTR_CONSUMPTION: item[ATTR_CONSUMPTION]
-                }
-            self._attrs[ATTR_CURRENT] = {
+    def _update_from_data(self, history_data) -> None:
+        # 每月数据导入长期统计, 属性中只保留本期数据
+        self._attrs = {
+            ATTR_CURRENT: {
                 ATTR_BILL: history_data[ATTR_CURRENT][ATTR_BILL],
                 ATTR_CONSUMPTION: history_data[ATTR_CURRENT][ATTR_CONSUMPTION]
+            },
+            ATTR_STATISTIC_ID: {
+                ATTR_BILL: get_statistic_id(self.coordinator.account_number, "monthly_bill"),
+                ATTR_CONSUMPTION: get_statistic_id(self.coordinator.account_number, "monthly_consumption")
             }
-            self._state = history_data[ATTR_CURRENT][ATTR_BILL]
-
-            self._available = True
-
-        except aiohttp.ClientError:
-            self._available = False
-            _LOGGER.exception("从IMPC获取数据失败")
+        }
+        self._state = history_data[ATTR_CURRENT][ATTR_BILL]
 
 
-class MdejDailySensor(Entity):
+class MdejDailySensor(ImpcCoordinatorSensor):
     """蒙电e家每日数据"""
 
-    def __init__(self, mdej_api: MdejAPI):
-        super().__init__()
+    _data_key = ATTR_DAILY
+    _restore_attributes = (ATTR_DATE, ATTR_STATISTIC_ID)
 
-        self._mdej_api = mdej_api
-        self._name = f"每日电量_{mdej_api.account_name}"
-        self._attr_unique_id = f"{DOMAIN}_{self._mdej_api.account_number}_{ATTR_DAILY}_{ATTR_CONSUMPTION}"
+    def __init__(self, coordinator: ImpcDataUpdateCoordinator):
+        super().__init__(coordinator)
+
+        self._name = f"每日电量_{coordinator.account_name}"
+        self._attr_unique_id = f"{DOMAIN}_{coordinator.account_number}_{ATTR_DAILY}_{ATTR_CONSUMPTION}"
         self.entity_id = f"sensor.{self._attr_unique_id}"
-        self._state = None
-        self._available = False
-        self._data = None
         self._attrs = None
 
         _LOGGER.debug(f"MdejDailySensor unique id: {self._attr_unique_id}")
@@ -252,10 +392,6 @@ class MdejDailySensor(Entity):
         # 使用 account_number 生成唯一标识符
         return self._attr_unique_id
 
-    @property
-    def available(self) -> bool:
-        return self._available
-
     @property
     def state(self) -> Optional[float]:
         return self._state
@@ -272,18 +408,187 @@ class MdejDailySensor(Entity):
     def extra_state_attributes(self) -> Dict[str, Any]:
         return self._attrs
 
-    async def async_update(self):
-        try:
+    def _update_from_data(self, daily_data: DailySeries) -> None:
+        # 每日数据导入长期统计, 属性中只保留最新一天的日期
+        last = daily_data.last
+        self._attrs = {
+            ATTR_DATE: last.isoformat(),
+            ATTR_STATISTIC_ID: get_statistic_id(self.coordinator.account_number, "daily_consumption")
+        }
+
+        self._state = daily_data.get(last, ATTR_CONSUMPTION)
+
+
+class MdejDailyAggregateSensor(ImpcCoordinatorSensor):
+    """
+    由每日数据派生: 本月电量, 近几日日均电量, 本月预计电量
+    使用 DailyStore 合并时增量维护的汇总, 不额外请求接口, 也不遍历每日数据
+    """
+
+    _data_key = ATTR_DAILY
+    _restore_attributes = (ATTR_DATE, ATTR_MONTH, ATTR_DAYS)
+
+    def __init__(self, coordinator: ImpcDataUpdateCoordinator, key: str):
+        super().__init__(coordinator)
+        self._key = key
+
+        name, self._icon = DAILY_AGGREGATE_SENSORS[key]
+        self._name = f"{name}_{coordinator.account_name}"
+        self._attr_unique_id = f"{DOMAIN}_{coordinator.account_number}_{ATTR_DAILY}_{key}"
+        self.entity_id = f"sensor.{self._attr_unique_id}"
+        self._attrs = None
 
-            daily_data = await self._mdej_api.get_daily()
-            self._attrs = {}
-            for item in daily_data:
-                self._attrs[item[ATTR_DATE]] = item[ATTR_CONSUMPTION]
+        _LOGGER.debug(f"MdejDailyAggregateSensor unique id: {self._attr_unique_id}")
 
-            self._state = daily_data[-1][ATTR_CONSUMPTION]
+    @property
+    def name(self) -> str:
+        return self._name
 
-            self._available = True
+    @property
+    def unique_id(self) -> str:
+        return self._attr_unique_id
+
+    @property
+    def icon(self):
+        return self._icon
+
+    @property
+    def unit_of_measurement(self):
+        return UNIT_KILOWATT_HOUR
+
+    @property
+    def extra_state_attributes(self) -> Dict[str, Any]:
+        return self._attrs
 
-        except aiohttp.ClientError:
-            self._available = False
-            _LOGGER.exception("从MDEJ获取数据失败")
+    def _get_coordinator_data(self):
+        # 汇总随本地序列加载, 首次刷新之前即可使用
+        return self.coordinator.daily_store.aggregates.as_dict()
+
+    def _update_from_data(self, aggregates: dict) -> None:
+        self._attrs = {
+            ATTR_DATE: aggregates[ATTR_DATE],
+            ATTR_MONTH: aggregates[ATTR_MONTH],
+            ATTR_DAYS: aggregates[ATTR_DAYS],
+        }
+        self._state = aggregates[self._key]
+
+
+class ImpcEstimateSensor(ImpcCoordinatorSensor):
+    """
+    按阶梯电价估算: 本月预估电费, 预估余额
+    用电类别与结算余额来自余额数据, 本月电量来自每日数据的汇总, 不额外请求接口;
+    不支持的用电类别 (非居民, 合表用户) 不可用
+    """
+
+    _data_key = ATTR_BALANCE
+    _restore_attributes = (ATTR_DATE, ATTR_MONTH, ATTR_CONSUMPTION)
+
+    def __init__(self, coordinator: ImpcDataUpdateCoordinator, key: str):
+        super().__init__(coordinator)
+        self._key = key
+
+        name, self._icon = ESTIMATE_SENSORS[key]
+        self._name = f"{name}_{coordinator.account_name}"
+        self._attr_unique_id = f"{DOMAIN}_{coordinator.account_number}_estimated_{key}"
+        self.entity_id = f"sensor.{self._attr_unique_id}"
+        self._attrs = None
+
+        _LOGGER.debug(f"ImpcEstimateSensor unique id: {self._attr_unique_id}")
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def unique_id(self) -> str:
+        return self._attr_unique_id
+
+    @property
+    def icon(self):
+        return self._icon
+
+    @property
+    def unit_of_measurement(self):
+        return UNIT_CURRENCY_YUAN
+
+    @property
+    def extra_state_attributes(self) -> Dict[str, Any]:
+        return self._attrs
+
+    def _get_coordinator_data(self):
+        # 重启后余额数据可能要等很久才到期, 期间使用本地保存的上一次余额数据
+        basic_data = super()._get_coordinator_data() or self.coordinator.daily_store.basic
+        if basic_data is None:
+            return None
+        return estimate_bill(basic_data.get(ATTR_CATEGORY), self.coordinator.daily_store.aggregates,
+                             basic_data.get(ATTR_BALANCE))
+
+    def _update_from_data(self, estimate: dict) -> None:
+        self._attrs = {
+            ATTR_CATEGORY: estimate[ATTR_CATEGORY],
+            ATTR_DATE: estimate[ATTR_DATE],
+            ATTR_MONTH: estimate[ATTR_MONTH],
+            ATTR_CONSUMPTION: estimate[ATTR_CONSUMPTION],
+            ATTR_TIER: estimate[ATTR_TIER],
+            ATTR_PRICE: estimate[ATTR_PRICE],
+        }
+        if self._key == ATTR_BILL:
+            self._attrs[ATTR_PROJECTED] = estimate[ATTR_PROJECTED]
+        self._state = estimate[self._key]
+
+
+class ImpcLastQuerySensor(CoordinatorEntity, SensorEntity):
+    """
+    最后查询时间 (诊断)
+    数据没有变化时其他传感器不会写入状态, 查询是否成功在这里体现
+    """
+
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_icon = "mdi:clock-check-outline"
+
+    def __init__(self, coordinator: ImpcDataUpdateCoordinator):
+        super().__init__(coordinator)
+
+        self._attr_name = f"最后查询时间_{coordinator.account_name}"
+        self._attr_unique_id = f"{DOMAIN}_{coordinator.account_number}_{ATTR_LAST_QUERY}"
+        self.entity_id = f"sensor.{self._attr_unique_id}"
+
+    @property
+    def available(self) -> bool:
+        return self.coordinator.last_query is not None
+
+    @property
+    def native_value(self) -> Optional[datetime.datetime]:
+        return self.coordinator.last_query
+
+
+class ImpcEndpointLatencySensor(CoordinatorEntity, SensorEntity):
+    """
+    接口延迟 (诊断, 默认禁用)
+    状态为最近请求的 p95 延迟, 属性中包含请求次数, 失败, 重试及最后成功时间
+    同一蒙电e家用户名下的户号共用蒙电e家接口的统计
+    """
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_icon = "mdi:timer-outline"
+
+    def __init__(self, coordinator: ImpcDataUpdateCoordinator, metrics: ApiMetrics, endpoint: str):
+        super().__init__(coordinator)
+        self._metrics = metrics
+        self._endpoint = endpoint
+
+        key = endpoint.replace("/", "_").lower()
+        self._attr_name = f"接口延迟_{endpoint}_{coordinator.account_name}"
+        self._attr_unique_id = f"{DOMAIN}_{coordinator.account_number}_latency_{key}"
+        self.entity_id = f"sensor.{self._attr_unique_id}"
+
+    @property
+    def native_value(self) -> Optional[float]:
+        return self._metrics.get(self._endpoint).as_dict()["latency_p95_ms"]
+
+    @property
+    def extra_state_attributes(self) -> Dict[str, Any]:
+        return self._metrics.get(self._endpoint).as_dict()
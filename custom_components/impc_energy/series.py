@@ -0,0 +1,336 @@
+# 紧凑的时间序列
+# 起点偏移 + 每列一个 array('d'), 代替每天/每月一个 dict; 数百个户号, 多年数据时可以明显减少内存与 GC 压力
+
+import calendar
+import datetime
+import math
+
+from array import array
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from .const import (
+    ATTR_BILL,
+    ATTR_CONSUMPTION,
+    ATTR_DAILY_AVERAGE,
+    ATTR_DATE,
+    ATTR_DAYS,
+    ATTR_MONTH,
+    ATTR_MONTH_TO_DATE,
+    ATTR_PROJECTED,
+    DAILY_AVERAGE_DAYS
+)
+
+_EPOCH = datetime.date(1970, 1, 1)
+_NAN = float("nan")
+
+
+def json_default(value):
+    """
+    json.dumps 的 default: 序列输出为 {start, 各列的数组}, 其他类型 (如日期) 转为字符串
+    """
+    if isinstance(value, _Series):
+        return value.as_dict()
+    return str(value)
+
+
+class _Series(object):
+    """
+    按固定步长 (天/月) 排列的序列
+    start 为第一条数据相对 1970 年的偏移 (天数/月数), 缺失的数据为 NaN
+    在末尾追加为 O(1); 在开头之前插入需要移动整个数组, 只在回填时发生
+    """
+
+    __slots__ = ("start", "_columns")
+
+    COLUMNS: Tuple[str, ...] = ()
+
+    def __init__(self, start: Optional[int] = None, columns: Optional[Dict[str, array]] = None):
+        self.start = start
+        self._columns = columns or {name: array("d") for name in self.COLUMNS}
+
+    # 子类实现: 周期 (date / "YYYYMM") 与偏移的转换
+    @staticmethod
+    def to_index(period) -> int:
+        raise NotImplementedError
+
+    @staticmethod
+    def from_index(index: int):
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        return len(self._columns[self.COLUMNS[0]])
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    @property
+    def end(self) -> Optional[int]:
+        """最后一条之后的偏移"""
+        return None if self.start is None else self.start + len(self)
+
+    @property
+    def first(self):
+        return None if not self else self.from_index(self.start)
+
+    @property
+    def last(self):
+        return None if not self else self.from_index(self.end - 1)
+
+    def column(self, name: str) -> array:
+        return self._columns[name]
+
+    def set(self, period, **values: float) -> bool:
+        """
+        写入一条数据, 只覆盖传入的列
+        :return: 是否有变化
+        """
+        index = self.to_index(period)
+        if self.start is None:
+            self.start = index
+        elif index < self.start:
+            for name, column in self._columns.items():
+                self._columns[name] = array("d", [_NAN] * (self.start - index)) + column
+            self.start = index
+
+        offset = index - self.start
+        if offset >= len(self):
+            for column in self._columns.values():
+                column.extend([_NAN] * (offset - len(column) + 1))
+
+        changed = False
+        for name, value in values.items():
+            column = self._columns[name]
+            value = float(value)
+            old = column[offset]
+            if not (old == value or (math.isnan(old) and math.isnan(value))):
+                column[offset] = value
+                changed = True
+        return changed
+
+    def get(self, period, name: str) -> Optional[float]:
+        if not self:
+            return None
+        offset = self.to_index(period) - self.start
+        if not 0 <= offset < len(self):
+            return None
+        value = self._columns[name][offset]
+        return None if math.isnan(value) else value
+
+    def slice(self, first=None, last=None):
+        """
+        截取 [first, last] 范围内的数据, 返回新的序列
+        """
+        if not self:
+            return type(self)()
+        lo = max(self.to_index(first) - self.start, 0) if first is not None else 0
+        hi = min(self.to_index(last) - self.start + 1, len(self)) if last is not None else len(self)
+        if lo >= hi:
+            return type(self)()
+        return type(self)(self.start + lo, {name: column[lo:hi] for name, column in self._columns.items()})
+
+    def tail(self, count: int):
+        """最后 count 条"""
+        if count >= len(self):
+            return self.slice()
+        return self.slice(self.from_index(self.end - count))
+
+    def trim(self, count: int):
+        """只保留最后 count 条"""
+        drop = len(self) - count
+        if count <= 0 or drop <= 0:
+            return
+        for column in self._columns.values():
+            del column[:drop]
+        self.start += drop
+
+    def items(self) -> Iterator[Tuple[object, Dict[str, float]]]:
+        """
+        按顺序遍历 (周期, {列: 值}), 跳过全部缺失的周期
+        """
+        for offset in range(len(self)):
+            values = {name: column[offset] for name, column in self._columns.items()
+                      if not math.isnan(column[offset])}
+            if values:
+                yield self.from_index(self.start + offset), values
+
+    def as_dict(self) -> dict:
+        """用于持久化与计算指纹; NaN 保存为 None"""
+        return {
+            "start": str(self.first) if self else None,
+            **{name: [None if math.isnan(value) else value for value in column]
+               for name, column in self._columns.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        series = cls()
+        if not data or data.get("start") is None:
+            return series
+        series.start = cls.to_index(data["start"])
+        for name in cls.COLUMNS:
+            series._columns[name] = array("d", (_NAN if value is None else value for value in data.get(name, [])))
+        length = max(len(column) for column in series._columns.values())
+        for column in series._columns.values():
+            column.extend([_NAN] * (length - len(column)))
+        return series
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.as_dict() == other.as_dict()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.first}..{self.last}, {len(self)})"
+
+
+class DailySeries(_Series):
+    """
+    每日用电量, 周期为 datetime.date (也接受 "YYYY-MM-DD")
+    """
+
+    __slots__ = ()
+
+    COLUMNS = (ATTR_CONSUMPTION,)
+
+    @staticmethod
+    def to_index(period) -> int:
+        if isinstance(period, str):
+            period = datetime.date.fromisoformat(period)
+        return (period - _EPOCH).days
+
+    @staticmethod
+    def from_index(index: int) -> datetime.date:
+        return _EPOCH + datetime.timedelta(days=index)
+
+
+class MonthlySeries(_Series):
+    """
+    每月电量电费, 周期为 "YYYYMM"
+    """
+
+    __slots__ = ()
+
+    COLUMNS = (ATTR_BILL, ATTR_CONSUMPTION)
+
+    @staticmethod
+    def to_index(period) -> int:
+        period = str(period)
+        return (int(period[:4]) - 1970) * 12 + int(period[4:6]) - 1
+
+    @staticmethod
+    def from_index(index: int) -> str:
+        return "%d%02d" % (1970 + index // 12, index % 12 + 1)
+
+    def set_year(self, year: int, data: dict, months: Iterable[int] = range(1, 13)):
+        """
+        写入某年的 zztList 数据
+        :param months: 要写入的月份
+        """
+        for month in months:
+            self.set("%d%02d" % (year, month), **{
+                ATTR_BILL: data["df"][month - 1],
+                ATTR_CONSUMPTION: data["dl"][month - 1]
+            })
+
+
+class DailyAggregates(object):
+    """
+    每日用电量的滚动汇总: 本月累计及最近 window 天的合计
+    以序列中最后一天为准 (每日数据有延迟, 不是今天); 缺失的日期不计入天数
+
+    DailyStore 每写入一天调用一次 update, 按差值更新, 不需要重新遍历序列;
+    只有跨月, 或最后一天前进超过 window 天时才从序列中重新计算 (最多一个月的数据)
+    """
+
+    __slots__ = ("_series", "_window", "end", "month_sum", "month_days", "window_sum", "window_days")
+
+    def __init__(self, series: DailySeries, window: int = DAILY_AVERAGE_DAYS):
+        self._series = series
+        self._window = window
+        self.rebuild()
+
+    def _sum(self, first: datetime.date, last: datetime.date) -> Tuple[float, int]:
+        values = [value for value in self._series.slice(first, last).column(ATTR_CONSUMPTION) if not math.isnan(value)]
+        return math.fsum(values), len(values)
+
+    def _rebuild_month(self):
+        self.month_sum, self.month_days = self._sum(self.end.replace(day=1), self.end)
+
+    def _rebuild_window(self):
+        self.window_sum, self.window_days = self._sum(self.end - datetime.timedelta(days=self._window - 1), self.end)
+
+    def rebuild(self):
+        """从序列中重新计算"""
+        self.end = self._series.last
+        self.month_sum = self.window_sum = 0.0
+        self.month_days = self.window_days = 0
+        if self.end is not None:
+            self._rebuild_month()
+            self._rebuild_window()
+
+    def update(self, date: datetime.date, old: Optional[float], new: float):
+        """
+        序列中写入一天之后调用
+        :param old: 写入前的值, 之前没有数据时为 None
+        """
+        if self.end is None or date > self.end:
+            previous, self.end = self.end, date
+
+            if previous is None or (date.year, date.month) != (previous.year, previous.month):
+                self._rebuild_month()
+            else:
+                self.month_sum += new
+                self.month_days += 1
+
+            advance = (date - previous).days if previous is not None else self._window
+            if advance >= self._window:
+                self._rebuild_window()
+            else:
+                # 移出窗口的日期
+                for offset in range(advance):
+                    value = self._series.get(previous - datetime.timedelta(days=self._window - 1 - offset),
+                                             ATTR_CONSUMPTION)
+                    if value is not None:
+                        self.window_sum -= value
+                        self.window_days -= 1
+                self.window_sum += new
+                self.window_days += 1
+            return
+
+        # 修正已有的日期
+        delta = new - (old or 0.0)
+        added = 1 if old is None else 0
+        if (date.year, date.month) == (self.end.year, self.end.month):
+            self.month_sum += delta
+            self.month_days += added
+        if (self.end - date).days < self._window:
+            self.window_sum += delta
+            self.window_days += added
+
+    @property
+    def month_to_date(self) -> Optional[float]:
+        """本月截至最后一天的电量"""
+        return None if self.end is None else round(self.month_sum, 2)
+
+    @property
+    def daily_average(self) -> Optional[float]:
+        """最近 window 天有数据的日期的平均电量"""
+        return round(self.window_sum / self.window_days, 2) if self.window_days else None
+
+    @property
+    def projected(self) -> Optional[float]:
+        """按本月已有数据的日均电量估算的整月电量"""
+        if not self.month_days:
+            return None
+        days_in_month = calendar.monthrange(self.end.year, self.end.month)[1]
+        return round(self.month_sum / self.month_days * days_in_month, 2)
+
+    def as_dict(self) -> Optional[dict]:
+        if self.end is None:
+            return None
+        return {
+            ATTR_DATE: self.end.isoformat(),
+            ATTR_MONTH: self.end.strftime("%Y%m"),
+            ATTR_DAYS: self.month_days,
+            ATTR_MONTH_TO_DATE: self.month_to_date,
+            ATTR_DAILY_AVERAGE: self.daily_average,
+            ATTR_PROJECTED: self.projected,
+        }
@@ -0,0 +1,176 @@
+# 导入长期统计数据
+
+import datetime
+import logging
+
+from typing import Iterable, List, Tuple
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    get_last_statistics
+)
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    DOMAIN,
+    ATTR_BILL,
+    ATTR_CONSUMPTION,
+    ATTR_HISTORY,
+    DAILY_OVERLAP_DAYS,
+    STATISTICS_OVERLAP_MONTHS,
+    UNIT_CURRENCY_YUAN,
+    UNIT_KILOWATT_HOUR
+)
+from .series import DailySeries
+from .store import is_year_settled
+
+_LOGGER = logging.getLogger(__name__)
+tz = datetime.timezone(datetime.timedelta(hours=+8))
+
+
+def get_statistic_id(account_number: str, kind: str) -> str:
+    """
+    外部统计数据的 id
+    :param kind: daily_consumption / monthly_consumption / monthly_bill
+    """
+    return f"{DOMAIN}:{account_number}_{kind}".lower()
+
+
+async def _async_get_last_rows(hass: HomeAssistant, statistic_id: str, count: int) -> List[Tuple[float, float]]:
+    """
+    获取已导入的最后几条统计
+    :return: [(开始时间戳, 累计值)], 按时间升序
+    """
+    last = await get_instance(hass).async_add_executor_job(
+        get_last_statistics, hass, count, statistic_id, True, {"sum"}
+    )
+    result = []
+    for row in last.get(statistic_id) or []:
+        start = row["start"]
+        # 旧版本返回 datetime, 新版本返回时间戳
+        if isinstance(start, datetime.datetime):
+            start = start.timestamp()
+        result.append((start, row.get("sum") or 0.0))
+    return sorted(result)
+
+
+async def _async_get_base(hass: HomeAssistant, statistic_id: str,
+                          rows: List[Tuple[datetime.datetime, float]], overlap: int) -> Tuple[int, float]:
+    """
+    确定本次要 (重新) 导入的范围
+    范围从已导入的最后 overlap 条开始 (这几条的数值可能已被修正), 包括之后的全部新数据;
+    累计值从范围之前的最后一条已有统计接着计算
+
+    :return: (从 rows 的第几条开始导入, 此前的累计值)
+    """
+    count = overlap + 1
+    while True:
+        imported = await _async_get_last_rows(hass, statistic_id, count)
+        if not imported:
+            return 0, 0.0
+
+        last_start = imported[-1][0]
+        index = sum(1 for start, _value in rows if start.timestamp() <= last_start)
+        index = max(index - overlap, 0)
+        if index >= len(rows):
+            return index, imported[-1][1]
+
+        window_start = rows[index][0].timestamp()
+        before = [total for start, total in imported if start < window_start]
+        if before:
+            return index, before[-1]
+        if len(imported) < count:
+            # 范围之前没有统计
+            return index, 0.0
+        # 范围内的已有统计比预计的多 (例如日期有间隔), 多取一些
+        count *= 2
+
+
+async def _async_import(hass: HomeAssistant, statistic_id: str, name: str, unit: str,
+                        rows: Iterable[Tuple[datetime.datetime, float]], overlap: int = 0,
+                        full: bool = False) -> int:
+    """
+    增量导入: 重新导入已有的最后 overlap 条 (回写被修正的数值) 及之后的新数据,
+    累计值从这些数据之前的最后一条统计接着计算
+
+    :param rows: (开始时间, 数值), 按时间升序
+    :param overlap: 重新导入已有统计的条数
+    :param full: 全量导入, 从第一条开始重新计算累计值并覆盖已有的统计; rows 需要是完整的序列
+    :return: 导入的条数
+    """
+    rows = list(rows)
+    index, total = (0, 0.0) if full else await _async_get_base(hass, statistic_id, rows, overlap)
+
+    statistics: List[StatisticData] = []
+    for start, value in rows[index:]:
+        total += value
+        statistics.append(StatisticData(start=start, state=value, sum=total))
+
+    if not statistics:
+        return 0
+
+    metadata = StatisticMetaData(
+        has_mean=False,
+        has_sum=True,
+        name=name,
+        source=DOMAIN,
+        statistic_id=statistic_id,
+        unit_of_measurement=unit,
+    )
+    async_add_external_statistics(hass, metadata, statistics)
+    _LOGGER.debug("导入统计数据, id: [%s], 条数: [%d]", statistic_id, len(statistics))
+    return len(statistics)
+
+
+def _recorder_loaded(hass: HomeAssistant) -> bool:
+    return "recorder" in hass.config.components
+
+
+async def async_import_daily_statistics(hass: HomeAssistant, account_number: str, account_name: str,
+                                        daily_data: DailySeries):
+    """
+    导入每日用电量
+    :param daily_data: 每日用电量序列
+    """
+    if not _recorder_loaded(hass):
+        return
+
+    rows = []
+    for date, values in daily_data.items():
+        start = datetime.datetime(date.year, date.month, date.day, tzinfo=tz)
+        rows.append((start, values[ATTR_CONSUMPTION]))
+
+    # 每次获取时会向前多取几天以获取被修正的数据, 这几天的统计也要重新导入
+    await _async_import(hass, get_statistic_id(account_number, "daily_consumption"),
+                        f"每日电量_{account_name}", UNIT_KILOWATT_HOUR, rows, DAILY_OVERLAP_DAYS + 1)
+
+
+async def async_import_monthly_statistics(hass: HomeAssistant, account_number: str, account_name: str,
+                                          history_data: dict, full: bool = False):
+    """
+    导入每月电量电费
+    :param history_data: EnergyAPI.get_history_data 的返回值
+    :param full: 全量导入, 回填更早的年份后使用
+    """
+    if not _recorder_loaded(hass):
+        return
+
+    consumption_rows = []
+    bill_rows = []
+    for month, values in history_data[ATTR_HISTORY].items():
+        year = int(month[:4])
+        # 上月在结算前 (每月1~2号) 返回0, 未结算年份中电量电费都为0的月份视为尚未结算, 不导入
+        if not is_year_settled(year) and not any(values.values()):
+            continue
+        start = datetime.datetime(year, int(month[4:]), 1, tzinfo=tz)
+        if ATTR_CONSUMPTION in values:
+            consumption_rows.append((start, values[ATTR_CONSUMPTION]))
+        if ATTR_BILL in values:
+            bill_rows.append((start, values[ATTR_BILL]))
+
+    await _async_import(hass, get_statistic_id(account_number, "monthly_consumption"),
+                        f"月度电量_{account_name}", UNIT_KILOWATT_HOUR, consumption_rows, STATISTICS_OVERLAP_MONTHS, full)
+    await _async_import(hass, get_statistic_id(account_number, "monthly_bill"),
+                        f"月度电费_{account_name}", UNIT_CURRENCY_YUAN, bill_rows, STATISTICS_OVERLAP_MONTHS, full)
@@ -0,0 +1,191 @@
+# 本地持久化存储
+
+import datetime
+import logging
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    DOMAIN,
+    ATTR_CONSUMPTION,
+    DAILY_MAX_FETCH_DAYS,
+    DAILY_OVERLAP_DAYS,
+    DAILY_RETENTION_DAYS
+)
+from .series import DailyAggregates, DailySeries, MonthlySeries
+
+_LOGGER = logging.getLogger(__name__)
+tz = datetime.timezone(datetime.timedelta(hours=+8))
+
+STORAGE_VERSION = 1
+# 合并写入, 避免频繁写盘
+STORAGE_SAVE_DELAY = 10
+
+
+def is_year_settled(year: int, now: Optional[datetime.datetime] = None) -> bool:
+    """
+    判断某年的电量电费是否已结算完毕
+    12月的电费在次年1月结算, 所以要到次年2月才认为上一年已结算
+
+    :param year: 年份
+    :param now: 当前时间, 默认取东八区当前时间
+    """
+    now = now or datetime.datetime.now(tz)
+    if year >= now.year:
+        return False
+    if year == now.year - 1 and now.month == 1:
+        return False
+    return True
+
+
+class HistoryStore(object):
+    """
+    已结算年份的历史数据缓存 (zztList)
+    按户号存储, 以年份为键, 只缓存已结算的年份
+    """
+
+    def __init__(self, hass: HomeAssistant, account_number: str):
+        self._account_number = account_number
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.history_{account_number}")
+        self._years: Dict[str, Any] = {}
+
+    async def async_load(self):
+        data = await self._store.async_load() or {}
+        years = data.get("years", {})
+
+        # 丢弃未结算年份的数据 (例如在结算前写入的旧数据)
+        self._years = {year: value for year, value in years.items() if is_year_settled(int(year))}
+        _LOGGER.debug("加载历史数据缓存, 户号: [%s], 年份: [%s]", self._account_number, list(self._years))
+
+    def get(self, year: int) -> Optional[dict]:
+        if not is_year_settled(year):
+            return None
+        return self._years.get(str(year))
+
+    @property
+    def years(self) -> List[int]:
+        """已缓存的年份"""
+        return sorted(int(year) for year in self._years)
+
+    def monthly_series(self) -> MonthlySeries:
+        """
+        已缓存年份的每月数据
+        去掉开头电量电费都为0的月份 (开户之前)
+        """
+        series = MonthlySeries()
+        for year in self.years:
+            series.set_year(year, self._years[str(year)])
+        for month, values in series.items():
+            if any(values.values()):
+                return series.slice(month)
+        return MonthlySeries()
+
+    async def async_set(self, year: int, data: dict):
+        """
+        写入某年的数据, 未结算的年份不会被缓存
+        """
+        if not is_year_settled(year):
+            return
+        if len(data.get("df", [])) < 12 or len(data.get("dl", [])) < 12:
+            _LOGGER.warning("历史数据不完整, 不缓存, 户号: [%s], 年份: [%s]", self._account_number, year)
+            return
+        self._years[str(year)] = data
+        await self._store.async_save({"years": self._years})
+
+    async def async_invalidate(self, years: Optional[Iterable[int]] = None):
+        """
+        清除缓存, 用于强制重新获取
+        :param years: 要清除的年份, 为空时清除全部
+        """
+        if years is None:
+            self._years = {}
+        else:
+            for year in years:
+                self._years.pop(str(year), None)
+        await self._store.async_save({"years": self._years})
+
+    async def async_remove(self):
+        await self._store.async_remove()
+
+
+class DailyStore(object):
+    """
+    每日用电量的本地序列 (getKfrydl)
+    按户号存储, 记录已有的最后日期, 用于只请求缺失的天数
+    合并时同时更新 aggregates (本月累计, 近几日合计), 供派生的传感器使用
+    另外保存最近一次获取的余额数据 (结算余额, 用电类别), 重启后余额未到期时也能继续估算电费
+    """
+
+    def __init__(self, hass: HomeAssistant, account_number: str, retention_days: int = DAILY_RETENTION_DAYS):
+        self._account_number = account_number
+        self._retention_days = retention_days
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.daily_{account_number}")
+        self._series = DailySeries()
+        self.aggregates = DailyAggregates(self._series)
+        self.basic: Optional[dict] = None
+
+    async def async_load(self):
+        data = await self._store.async_load() or {}
+        self._series = DailySeries.from_dict(data.get("series"))
+        self.aggregates = DailyAggregates(self._series)
+        self.basic = data.get("basic")
+        _LOGGER.debug("加载每日用电数据, 户号: [%s], 天数: [%d]", self._account_number, len(self._series))
+
+    @property
+    def last_date(self) -> Optional[datetime.date]:
+        return self._series.last
+
+    def days_to_fetch(self, today: Optional[datetime.date] = None) -> int:
+        """
+        计算本次需要请求的天数 (ts 参数)
+        从已有的最后日期开始, 并向前多取几天以获取被修正的数据
+        """
+        if self.last_date is None:
+            return DAILY_MAX_FETCH_DAYS
+        today = today or datetime.datetime.now(tz).date()
+        missing = (today - self.last_date).days
+        return max(1, min(DAILY_MAX_FETCH_DAYS, missing + DAILY_OVERLAP_DAYS))
+
+    def merge(self, series: DailySeries) -> int:
+        """
+        合并新获取的数据, 相同日期以新数据为准, 超出保留期的数据会被丢弃
+        :param series: MdejAPI.get_daily 的返回值
+        :return: 新增或修改的天数
+        """
+        changed = 0
+        for date, values in series.items():
+            old = self._series.get(date, ATTR_CONSUMPTION)
+            if self._series.set(date, **values):
+                self.aggregates.update(date, old, values[ATTR_CONSUMPTION])
+                changed += 1
+
+        if changed:
+            if self._retention_days:
+                self._series.trim(self._retention_days)
+            self._save()
+        return changed
+
+    def update_basic(self, basic: dict):
+        """
+        记录最近一次获取的余额数据
+        :param basic: EnergyAPI.get_basic_new 的返回值
+        """
+        if basic != self.basic:
+            self.basic = dict(basic)
+            self._save()
+
+    def _save(self):
+        self._store.async_delay_save(lambda: {"series": self._series.as_dict(), "basic": self.basic},
+                                     STORAGE_SAVE_DELAY)
+
+    def recent(self, days: int) -> DailySeries:
+        """
+        获取最近几天的数据, 格式与 MdejAPI.get_daily 相同
+        """
+        return self._series.tail(days)
+
+    async def async_remove(self):
+        await self._store.async_remove()
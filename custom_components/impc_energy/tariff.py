@@ -0,0 +1,109 @@
+# 阶梯电价估算
+# 余额与本期电费要等结算后才会变化, 这里用每日电量按阶梯电价在本地估算本月电费与余额, 不额外请求接口
+
+from typing import Optional, Sequence, Tuple
+
+from .const import (
+    ATTR_BALANCE,
+    ATTR_BILL,
+    ATTR_CATEGORY,
+    ATTR_CONSUMPTION,
+    ATTR_DATE,
+    ATTR_MONTH,
+    ATTR_PRICE,
+    ATTR_PROJECTED,
+    ATTR_TIER,
+    TARIFF_EXCLUDED_KEYWORDS,
+    TARIFF_RESIDENTIAL_KEYWORDS,
+    TARIFF_RESIDENTIAL_TIERS
+)
+from .series import DailyAggregates
+
+
+class TieredTariff(object):
+    """
+    按月用电量分档计价
+
+    :param tiers: [(该档电量上限, 电价), ...], 上限递增, 最后一档的上限为 None
+    """
+
+    def __init__(self, tiers: Sequence[Tuple[Optional[float], float]]):
+        self.tiers = tuple(tiers)
+
+    def tier(self, consumption: float) -> int:
+        """用电量所在的档位, 从1开始"""
+        for index, (limit, _price) in enumerate(self.tiers, 1):
+            if limit is None or consumption <= limit:
+                return index
+        return len(self.tiers)
+
+    def price(self, consumption: float) -> float:
+        """用电量所在档位的电价"""
+        return self.tiers[self.tier(consumption) - 1][1]
+
+    def cost(self, consumption: float) -> float:
+        """
+        一个月的电费
+        接口偶尔返回负的电量, 按0计算
+        """
+        remaining = max(consumption, 0.0)
+        lower = 0.0
+        total = 0.0
+        for limit, price in self.tiers:
+            amount = remaining if limit is None else min(remaining, limit - lower)
+            total += amount * price
+            remaining -= amount
+            if remaining <= 0:
+                break
+            lower = limit
+        return round(total, 2)
+
+
+RESIDENTIAL_TARIFF = TieredTariff(TARIFF_RESIDENTIAL_TIERS)
+
+
+def get_tariff(category: Optional[str]) -> Optional[TieredTariff]:
+    """
+    根据用电类别 (queryDfInfoNew 的 khxzmc, 如"城镇居民生活用电") 选择电价
+    目前只支持居民阶梯电价, 其他类别返回 None
+    """
+    if not category:
+        return None
+    if any(keyword in category for keyword in TARIFF_EXCLUDED_KEYWORDS):
+        return None
+    if any(keyword in category for keyword in TARIFF_RESIDENTIAL_KEYWORDS):
+        return RESIDENTIAL_TARIFF
+    return None
+
+
+def estimate_bill(category: Optional[str], aggregates: DailyAggregates,
+                  balance: Optional[float] = None) -> Optional[dict]:
+    """
+    估算本月电费及余额
+    本月电量取每日数据中最新一天所在月份的累计值; 预估余额为结算余额减去本月估算电费,
+    即假设余额中尚未扣除本月的电费
+
+    :param category: 用电类别
+    :param aggregates: DailyStore.aggregates
+    :param balance: 结算余额, 为空时不估算余额
+    :return: 不支持该用电类别或没有每日数据时为 None
+    """
+    tariff = get_tariff(category)
+    if tariff is None or aggregates.end is None:
+        return None
+
+    consumption = aggregates.month_to_date
+    bill = tariff.cost(consumption)
+    projected = aggregates.projected
+
+    return {
+        ATTR_CATEGORY: category,
+        ATTR_DATE: aggregates.end.isoformat(),
+        ATTR_MONTH: aggregates.end.strftime("%Y%m"),
+        ATTR_CONSUMPTION: consumption,
+        ATTR_BILL: bill,
+        ATTR_PROJECTED: tariff.cost(projected) if projected is not None else None,
+        ATTR_TIER: tariff.tier(consumption),
+        ATTR_PRICE: tariff.price(consumption),
+        ATTR_BALANCE: round(balance - bill, 2) if balance is not None else None,
+    }
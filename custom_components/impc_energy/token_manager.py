@@ -0,0 +1,123 @@
+# 蒙电e家 token 管理
+
+import asyncio
+import base64
+import json
+import logging
+import time
+
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from .const import (
+    MDEJ_TOKEN_REFRESH_MARGIN
+)
+from .exceptions import MdejAuthError
+from .mdej_api import MdejAPI
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def get_token_expiry(token: Optional[str]) -> Optional[float]:
+    """
+    解析 token 的过期时间
+    token 为 JWT 时读取其中的 exp 字段, 否则返回 None
+
+    :return: 过期时间 (unix 时间戳)
+    """
+    if not token:
+        return None
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = parts[1] + "=" * (-len(parts[1]) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims["exp"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class MdejTokenManager(object):
+    """
+    管理 MdejAPI 的 token
+    调用接口时遇到 token 失效会使用保存的 login_payload 重新登录并重试一次;
+    并发的调用方共享同一次登录, 新 token 通过 on_token_refreshed 回调写回配置条目
+
+    :param public_key: 计算 login_payload 时使用的公钥, 重新登录时一并发送
+    """
+
+    def __init__(self, api: MdejAPI, login_payload: Optional[str],
+                 on_token_refreshed: Optional[Callable[[str], None]] = None,
+                 refresh_margin: float = MDEJ_TOKEN_REFRESH_MARGIN, public_key: Optional[str] = None):
+        self._api = api
+        self._login_payload = login_payload
+        self._public_key = public_key
+        self._on_token_refreshed = on_token_refreshed
+        self._refresh_margin = refresh_margin
+        self._lock = asyncio.Lock()
+
+    @property
+    def api(self) -> MdejAPI:
+        return self._api
+
+    @property
+    def login_payload(self) -> Optional[str]:
+        return self._login_payload
+
+    @login_payload.setter
+    def login_payload(self, login_payload: Optional[str]):
+        self._login_payload = login_payload
+
+    @property
+    def public_key(self) -> Optional[str]:
+        return self._public_key
+
+    @public_key.setter
+    def public_key(self, public_key: Optional[str]):
+        self._public_key = public_key
+
+    def _is_expiring(self) -> bool:
+        expiry = get_token_expiry(self._api.token)
+        return expiry is not None and expiry - time.time() < self._refresh_margin
+
+    async def async_relogin(self, stale_token: Optional[str] = None) -> str:
+        """
+        重新登录
+        :param stale_token: 调用方发现失效的 token; 若当前 token 已不是它, 说明其他调用方已完成刷新, 直接返回
+        :return: 新 token
+        """
+        async with self._lock:
+            if stale_token is not None and self._api.token and self._api.token != stale_token:
+                _LOGGER.debug("token 已被刷新, 跳过登录")
+                return self._api.token
+
+            if not self._login_payload:
+                raise MdejAuthError("token 已失效, 且没有保存 login payload, 请重新配置蒙电e家")
+
+            _LOGGER.info("token 失效或即将过期, 重新登录")
+            token = await self._api.get_token(self._login_payload, self._public_key)
+            if self._on_token_refreshed:
+                self._on_token_refreshed(token)
+            return token
+
+    async def async_call(self, func: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """
+        调用需要 token 的接口
+        token 即将过期时先主动刷新, 刷新失败时继续使用当前 token; token 失效时重新登录并重试一次
+        """
+        if self._is_expiring():
+            try:
+                await self.async_relogin(self._api.token)
+            except Exception as e:
+                # token 还没有过期, 不影响本次调用
+                _LOGGER.warning("主动刷新 token 失败, 继续使用当前 token, 错误: [%s]", e)
+
+        token = self._api.token
+        try:
+            return await func(*args, **kwargs)
+        except MdejAuthError:
+            _LOGGER.warning("token 失效, 重新登录后重试")
+            await self.async_relogin(token)
+            return await func(*args, **kwargs)
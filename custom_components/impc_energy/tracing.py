@@ -0,0 +1,132 @@
+# 更新周期的耗时追踪
+# 开启后记录每个更新周期内各步骤的耗时 (嵌套的 span), 保存在内存中的环形缓冲区, 可导出为 Chrome trace 格式
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import itertools
+import time
+import weakref
+
+from typing import Deque, Optional
+
+from .const import (
+    TRACE_BUFFER_SIZE
+)
+
+# 当前更新周期使用的追踪器, 由协调器设置; 随 asyncio 任务的上下文传递, 所以 API 中不需要传入
+_current_tracer: contextvars.ContextVar[Optional["Tracer"]] = contextvars.ContextVar(
+    "impc_energy_tracer", default=None
+)
+
+
+class Span(object):
+    """
+    一个步骤的耗时
+    """
+
+    __slots__ = ("name", "start", "duration", "lane", "args")
+
+    def __init__(self, name: str, start: float, duration: float, lane: int, args: dict):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.lane = lane
+        self.args = args
+
+
+class Tracer(object):
+    """
+    追踪器, 每个户号一个
+    同一 asyncio 任务中的 span 按时间自然嵌套; 并发的任务 (如 asyncio.gather) 分配到不同的轨道, 避免重叠
+
+    :param name: 导出时的进程名, 一般为户号
+    :param capacity: 最多保留的 span 数量, 超出后丢弃最早的
+    """
+
+    def __init__(self, name: str, capacity: int = TRACE_BUFFER_SIZE, enabled: bool = False):
+        self.name = name
+        self.enabled = enabled
+        self._spans: Deque[Span] = collections.deque(maxlen=capacity)
+        self._lanes = weakref.WeakKeyDictionary()
+        self._lane_ids = itertools.count(1)
+
+    def _lane(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            return 0
+        lane = self._lanes.get(task)
+        if lane is None:
+            lane = self._lanes[task] = next(self._lane_ids)
+        return lane
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args):
+        lane = self._lane()
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            self._spans.append(Span(name, start, time.perf_counter() - start, lane, args))
+
+    @contextlib.contextmanager
+    def activate(self):
+        """
+        在这个上下文中调用 trace_span 时记录到本追踪器; 未开启时不记录
+        """
+        if not self.enabled:
+            yield
+            return
+        token = _current_tracer.set(self)
+        try:
+            yield
+        finally:
+            _current_tracer.reset(token)
+
+    def clear(self):
+        self._spans.clear()
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def export_chrome_trace(self, name: Optional[str] = None) -> dict:
+        """
+        导出为 Chrome trace event 格式, 可以在 chrome://tracing 或 https://ui.perfetto.dev 中打开
+        :param name: 进程名, 为空时使用追踪器的名称 (户号)
+        """
+        events = [{"name": "process_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": name or self.name}}]
+        for span in self._spans:
+            events.append({
+                "name": span.name,
+                "ph": "X",
+                "pid": 1,
+                "tid": span.lane,
+                "ts": round(span.start * 1e6, 1),
+                "dur": round(span.duration * 1e6, 1),
+                "args": span.args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+@contextlib.contextmanager
+def trace_span(name: str, **args):
+    """
+    记录一个步骤的耗时
+    当前上下文中没有开启的追踪器时什么也不做
+
+    with trace_span("dldf/zztList", year=2025):
+        ...
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield
+        return
+    with tracer.span(name, **args):
+        yield
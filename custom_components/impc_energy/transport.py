@@ -0,0 +1,226 @@
+# 可替换的请求传输层
+# 默认直接通过 aiohttp 请求; 也可以录制真实响应到 cassette 文件 (脱敏), 再离线回放, 用于测试与性能分析
+
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+import random
+
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .resilience import get_endpoint_name
+
+_LOGGER = logging.getLogger(__name__)
+
+# 录制时需要脱敏的字段 (请求参数与响应中的同名字段)
+SCRUB_FIELDS = {
+    "yhdabh": "0000000000000",
+    "name": "某小区某号楼某单元",
+    "addr": "******",
+    "token": "scrubbed-token",
+    "payLoad": "scrubbed-payload",
+}
+
+
+# 随日期变化的请求参数, 计算 cassette 文件名时需要归一化, 否则日期变化后录制的响应就对不上了
+# fxny: 查询的年份, 换算为相对今年的偏移; ts: 请求的天数, 增量获取时每天都不同, 忽略
+RELATIVE_YEAR_PARAMS = ("fxny",)
+IGNORED_PARAMS = ("ts",)
+
+tz = datetime.timezone(datetime.timedelta(hours=+8))
+
+
+def scrub(data: Any) -> Any:
+    """
+    递归替换需要脱敏的字段
+    """
+    if isinstance(data, dict):
+        return {key: SCRUB_FIELDS[key] if key in SCRUB_FIELDS else scrub(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [scrub(item) for item in data]
+    return data
+
+
+class TransportResponse(object):
+    """
+    已读取完毕的响应
+    """
+
+    __slots__ = ("status", "text")
+
+    def __init__(self, status: int, text: str):
+        self.status = status
+        self.text = text
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+class Transport(object):
+    """
+    传输层基类
+    """
+
+    async def request(self, method: str, url: str, *, params: Optional[dict] = None, json: Optional[dict] = None,
+                      headers: Optional[dict] = None,
+                      timeout: Optional[aiohttp.ClientTimeout] = None) -> TransportResponse:
+        raise NotImplementedError
+
+
+class AiohttpTransport(Transport):
+    """
+    通过 aiohttp 发送请求
+
+    :param session: session, 由调用方负责关闭
+    :param url_rewrites: 替换请求地址的前缀, 例如 {BASE_APP_API_URL: "http://127.0.0.1:8080"}
+    """
+
+    def __init__(self, session: aiohttp.ClientSession,
+                 url_rewrites: Optional[Dict[str, str]] = None):
+        self._session = session
+        self._url_rewrites = url_rewrites or {}
+
+    def _rewrite(self, url: str) -> str:
+        for prefix, replacement in self._url_rewrites.items():
+            if url.startswith(prefix):
+                return replacement + url[len(prefix):]
+        return url
+
+    async def request(self, method, url, *, params=None, json=None, headers=None, timeout=None):
+        async with self._session.request(method, self._rewrite(url), params=params, json=json,
+                                         headers=headers, timeout=timeout) as response:
+            text = await response.text(encoding="utf-8")
+            return TransportResponse(response.status, text)
+
+
+def _normalize_params(params: Optional[dict], today: Optional[datetime.date] = None) -> dict:
+    """
+    归一化随日期变化的参数: 年份换算为相对今年的偏移 (如 "y-1"), 忽略天数
+    """
+    today = today or datetime.datetime.now(tz).date()
+    normalized = {}
+    for key, value in scrub(params or {}).items():
+        if key in IGNORED_PARAMS:
+            continue
+        if key in RELATIVE_YEAR_PARAMS:
+            try:
+                value = "y%+d" % (int(value) - today.year)
+            except (TypeError, ValueError):
+                pass
+        normalized[key] = value
+    return normalized
+
+
+def _cassette_name(method: str, url: str, params: Optional[dict], json_body: Optional[dict],
+                   today: Optional[datetime.date] = None) -> str:
+    """
+    cassette 文件名
+    由接口名及脱敏, 归一化后的参数决定, 所以不同户号的同一请求对应同一个文件, 日期变化后也能回放
+    """
+    key = json.dumps({
+        "method": method.upper(),
+        "host": urlparse(url).hostname,
+        "path": urlparse(url).path,
+        "params": _normalize_params(params, today),
+        "json": scrub(json_body or {}),
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]
+    return f"{get_endpoint_name(urlparse(url).path).replace('/', '_')}__{digest}.json"
+
+
+class RecordingTransport(Transport):
+    """
+    录制: 请求交给 inner 处理, 并把脱敏后的请求与响应写入 cassette_dir
+    """
+
+    def __init__(self, inner: Transport, cassette_dir: str):
+        self._inner = inner
+        self._cassette_dir = cassette_dir
+
+    def _write(self, name: str, cassette: dict):
+        os.makedirs(self._cassette_dir, exist_ok=True)
+        with open(os.path.join(self._cassette_dir, name), "w", encoding="utf-8") as f:
+            json.dump(cassette, f, ensure_ascii=False, indent=2)
+
+    async def request(self, method, url, *, params=None, json=None, headers=None, timeout=None):
+        response = await self._inner.request(method, url, params=params, json=json, headers=headers, timeout=timeout)
+
+        try:
+            body = scrub(response.json())
+        except ValueError:
+            body = response.text
+
+        cassette = {
+            "request": {
+                "method": method.upper(),
+                "url": url,
+                "params": scrub(params or {}),
+                "json": scrub(json or {}),
+            },
+            "response": {
+                "status": response.status,
+                "body": body,
+            },
+        }
+        name = _cassette_name(method, url, params, json)
+        # 写文件放到线程池, 不阻塞事件循环
+        await asyncio.get_running_loop().run_in_executor(None, self._write, name, cassette)
+        _LOGGER.debug("录制请求: [%s]", name)
+        return response
+
+
+class ReplayTransport(Transport):
+    """
+    回放: 从 cassette_dir 读取录制的响应, 不访问网络
+
+    :param latency: 每个请求的固定延迟 (秒)
+    :param jitter: 在固定延迟上额外增加 [0, jitter) 秒的随机延迟
+    :param error_rate: 以该概率返回 HTTP 500
+    :param timeout_rate: 以该概率抛出超时
+    """
+
+    def __init__(self, cassette_dir: str, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, timeout_rate: float = 0.0, seed: Optional[int] = None):
+        self._cassette_dir = cassette_dir
+        self._latency = latency
+        self._jitter = jitter
+        self._error_rate = error_rate
+        self._timeout_rate = timeout_rate
+        self._random = random.Random(seed)
+        self._cache: Dict[str, TransportResponse] = {}
+
+    def _read(self, name: str) -> TransportResponse:
+        path = os.path.join(self._cassette_dir, name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"没有录制的响应: [{path}]")
+        with open(path, encoding="utf-8") as f:
+            cassette = json.load(f)["response"]
+        body = cassette["body"]
+        text = body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)
+        return TransportResponse(cassette["status"], text)
+
+    async def _load(self, name: str) -> TransportResponse:
+        response = self._cache.get(name)
+        if response is None:
+            # 读文件放到线程池, 不阻塞事件循环 (否则会计入基准测试的事件循环延迟)
+            response = await asyncio.get_running_loop().run_in_executor(None, self._read, name)
+            self._cache[name] = response
+        return response
+
+    async def request(self, method, url, *, params=None, json=None, headers=None, timeout=None):
+        delay = self._latency + self._random.uniform(0, self._jitter) if self._jitter else self._latency
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self._timeout_rate and self._random.random() < self._timeout_rate:
+            raise asyncio.TimeoutError(f"模拟超时: [{url}]")
+        if self._error_rate and self._random.random() < self._error_rate:
+            return TransportResponse(500, "模拟服务器错误")
+
+        return await self._load(_cassette_name(method, url, params, json))
@@ -0,0 +1,105 @@
+"""自适应轮询的窗口与间隔"""
+
+import datetime
+
+from custom_components.impc_energy.const import ATTR_BALANCE, ATTR_DAILY
+from custom_components.impc_energy.scheduler import SourceSchedule, tz
+
+HOUR = datetime.timedelta(hours=1)
+
+
+def _at(*args) -> datetime.datetime:
+    return datetime.datetime(*args, tzinfo=tz)
+
+
+def _daily(marks) -> SourceSchedule:
+    return SourceSchedule(ATTR_DAILY, HOUR, datetime.timedelta(hours=12), marks)
+
+
+def _balance(marks) -> SourceSchedule:
+    return SourceSchedule(ATTR_BALANCE, 2 * HOUR, datetime.timedelta(hours=24), marks)
+
+
+def test_daily_window_around_mark():
+    schedule = _daily((9,))
+    assert not schedule.in_window(_at(2024, 5, 10, 7, 59))
+    assert schedule.in_window(_at(2024, 5, 10, 8, 0))
+    assert schedule.in_window(_at(2024, 5, 10, 10, 59))
+    assert not schedule.in_window(_at(2024, 5, 10, 11, 0))
+
+
+def test_daily_window_crosses_midnight():
+    schedule = _daily((0,))
+    assert schedule.in_window(_at(2024, 12, 31, 23, 30))
+    assert schedule.in_window(_at(2025, 1, 1, 0, 30))
+    assert schedule.in_window(_at(2025, 1, 1, 1, 30))
+    assert not schedule.in_window(_at(2025, 1, 1, 2, 30))
+    assert not schedule.in_window(_at(2024, 12, 31, 22, 30))
+
+
+def test_daily_window_uses_local_time():
+    schedule = _daily((9,))
+    # UTC 01:00 为东八区 09:00
+    assert schedule.in_window(datetime.datetime(2024, 5, 10, 1, 0, tzinfo=datetime.timezone.utc))
+
+
+def test_daily_window_closes_after_change():
+    schedule = _daily((9,))
+    schedule.changes = [_at(2024, 5, 10, 9, 10)]
+    assert not schedule.in_window(_at(2024, 5, 10, 10, 0))
+    assert schedule.in_window(_at(2024, 5, 11, 8, 30))
+
+
+def test_monthly_window_crosses_month_end():
+    schedule = _balance((1,))
+    assert schedule.in_window(_at(2023, 2, 28, 12))
+    assert schedule.in_window(_at(2023, 3, 1, 12))
+    assert schedule.in_window(_at(2023, 3, 2, 12))
+    assert not schedule.in_window(_at(2023, 3, 3, 12))
+    assert not schedule.in_window(_at(2023, 2, 27, 12))
+    # 跨年
+    assert schedule.in_window(_at(2023, 12, 31, 23, 59))
+
+
+def test_monthly_mark_clamped_to_short_month():
+    schedule = _balance((31,))
+    assert schedule.in_window(_at(2023, 4, 29, 12))
+    assert schedule.in_window(_at(2023, 4, 30, 12))
+    assert schedule.in_window(_at(2023, 5, 1, 12))
+    assert not schedule.in_window(_at(2023, 4, 28, 12))
+    # 闰年2月按29号计算, 平年按28号
+    assert schedule.in_window(_at(2024, 2, 29, 12))
+    assert not schedule.in_window(_at(2024, 2, 27, 12))
+    assert schedule.in_window(_at(2023, 2, 27, 12))
+
+
+def test_next_interval_dense_inside_window():
+    assert _daily((9,)).next_interval(_at(2024, 5, 10, 9, 30)) == HOUR
+    assert _balance((2,)).next_interval(_at(2024, 5, 1, 12)) == 2 * HOUR
+
+
+def test_next_interval_aligns_to_window_start_after_midnight():
+    schedule = _daily((1,))
+    # 窗口为 0~2 点, 从 00:00 开始
+    assert schedule.next_interval(_at(2024, 5, 10, 20, 30)) == datetime.timedelta(hours=3, minutes=30)
+
+
+def test_next_interval_sparse_when_window_is_far():
+    schedule = _daily((9,))
+    assert schedule.next_interval(_at(2024, 5, 10, 11, 0)) == datetime.timedelta(hours=12)
+    assert _balance((15,)).next_interval(_at(2024, 5, 1, 12)) == datetime.timedelta(hours=24)
+
+
+def test_next_interval_across_month_end():
+    schedule = _balance((2,))
+    # 窗口为 1~3 号, 从次月1号 00:00 开始
+    assert schedule.next_interval(_at(2024, 1, 31, 10)) == datetime.timedelta(hours=14)
+    assert schedule.next_interval(_at(2024, 2, 29, 10)) == datetime.timedelta(hours=14)
+    # 月末的位置在小月提前到30号
+    assert _balance((31,)).next_interval(_at(2023, 4, 28, 20)) == datetime.timedelta(hours=4)
+
+
+def test_next_interval_not_shorter_than_dense():
+    schedule = _daily((9,))
+    # 07:50 时窗口的整点开始 (08:00) 只剩10分钟
+    assert schedule.next_interval(_at(2024, 5, 10, 7, 50)) == HOUR
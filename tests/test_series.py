@@ -0,0 +1,108 @@
+"""每日用电量的滚动汇总"""
+
+import datetime
+import random
+
+import pytest
+
+from custom_components.impc_energy.const import ATTR_CONSUMPTION
+from custom_components.impc_energy.series import DailyAggregates, DailySeries
+
+
+def _merge(series: DailySeries, aggregates: DailyAggregates, date: datetime.date, value: float):
+    """与 DailyStore.merge 相同: 写入有变化时按差值更新汇总"""
+    old = series.get(date, ATTR_CONSUMPTION)
+    if series.set(date, **{ATTR_CONSUMPTION: value}):
+        aggregates.update(date, old, value)
+
+
+def _assert_same_as_rebuild(aggregates: DailyAggregates, series: DailySeries):
+    rebuilt = DailyAggregates(series, window=aggregates._window)
+    assert aggregates.end == rebuilt.end
+    assert aggregates.month_days == rebuilt.month_days
+    assert aggregates.window_days == rebuilt.window_days
+    assert aggregates.month_sum == pytest.approx(rebuilt.month_sum)
+    assert aggregates.window_sum == pytest.approx(rebuilt.window_sum)
+
+
+def test_empty():
+    aggregates = DailyAggregates(DailySeries())
+    assert aggregates.end is None
+    assert aggregates.month_to_date is None
+    assert aggregates.daily_average is None
+    assert aggregates.projected is None
+    assert aggregates.as_dict() is None
+
+
+def test_append_across_month_boundary():
+    series = DailySeries()
+    aggregates = DailyAggregates(series, window=7)
+    date = datetime.date(2024, 1, 20)
+    while date <= datetime.date(2024, 3, 5):
+        _merge(series, aggregates, date, date.day)
+        _assert_same_as_rebuild(aggregates, series)
+        date += datetime.timedelta(days=1)
+
+    # 3月只有 1~5 号, 窗口跨越2月末 (闰年29号)
+    assert aggregates.month_days == 5
+    assert aggregates.month_to_date == 15
+    assert aggregates.window_days == 7
+    assert aggregates.daily_average == round((28 + 29 + 1 + 2 + 3 + 4 + 5) / 7, 2)
+    assert aggregates.projected == round(15 / 5 * 31, 2)
+
+
+def test_gaps_and_jumps_past_window():
+    series = DailySeries()
+    aggregates = DailyAggregates(series, window=7)
+    for date in (datetime.date(2023, 4, 28), datetime.date(2023, 4, 30), datetime.date(2023, 5, 3),
+                 datetime.date(2023, 5, 20), datetime.date(2023, 5, 31), datetime.date(2023, 6, 1)):
+        _merge(series, aggregates, date, 2.5)
+        _assert_same_as_rebuild(aggregates, series)
+
+    # 缺失的日期不计入天数
+    assert aggregates.month_days == 1
+    assert aggregates.window_days == 2
+
+
+def test_revisions_and_backfilled_days():
+    series = DailySeries()
+    aggregates = DailyAggregates(series, window=7)
+    first = datetime.date(2023, 12, 25)
+    for offset in range(0, 14, 2):
+        _merge(series, aggregates, first + datetime.timedelta(days=offset), 1.0)
+
+    # 修正窗口内、上个月、窗口外的日期, 以及补上缺失的日期
+    for date, value in ((datetime.date(2024, 1, 6), 4.0), (datetime.date(2023, 12, 31), 7.5),
+                        (datetime.date(2023, 12, 25), 3.0), (datetime.date(2024, 1, 2), 0.5),
+                        (datetime.date(2023, 12, 30), 2.0)):
+        _merge(series, aggregates, date, value)
+        _assert_same_as_rebuild(aggregates, series)
+
+
+def test_random_updates_match_rebuild():
+    rnd = random.Random(0)
+    series = DailySeries()
+    aggregates = DailyAggregates(series, window=7)
+    end = datetime.date(2022, 11, 15)
+    for _ in range(500):
+        if rnd.random() < 0.6:
+            # 向后写入, 偶尔跳过几天
+            end += datetime.timedelta(days=rnd.choice((1, 1, 1, 2, 3, 9)))
+            date = end
+        else:
+            # 修正最近40天内的某一天
+            date = end - datetime.timedelta(days=rnd.randrange(40))
+        _merge(series, aggregates, date, round(rnd.uniform(0, 20), 2))
+        _assert_same_as_rebuild(aggregates, series)
+
+
+def test_rebuild_from_loaded_series():
+    series = DailySeries()
+    for day in range(1, 31):
+        series.set(datetime.date(2023, 9, day), **{ATTR_CONSUMPTION: 3})
+
+    aggregates = DailyAggregates(series, window=7)
+    assert aggregates.as_dict()["month"] == "202309"
+    assert aggregates.month_to_date == 90
+    assert aggregates.daily_average == 3
+    assert aggregates.projected == 90
@@ -0,0 +1,75 @@
+"""录制/回放传输层"""
+
+import asyncio
+import datetime
+import json
+
+from custom_components.impc_energy.transport import (
+    RecordingTransport,
+    ReplayTransport,
+    Transport,
+    TransportResponse,
+    tz
+)
+
+URL = "http://yxwx.impc.com.cn/api/hlwyy/business-jffw/dldf/zztList"
+
+
+class FakeTransport(Transport):
+    """按参数返回固定响应, 记录请求次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def request(self, method, url, *, params=None, json=None, headers=None, timeout=None):
+        self.calls += 1
+        return TransportResponse(200, _dumps({
+            "code": 0,
+            "data": {"yhdabh": params["yhdabh"], "fxny": params["fxny"], "df": [1.5] * 12, "dl": [3] * 12},
+        }))
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False)
+
+
+def test_record_then_replay(tmp_path):
+    this_year = datetime.datetime.now(tz).year
+    inner = FakeTransport()
+
+    async def _record():
+        recorder = RecordingTransport(inner, str(tmp_path))
+        return await recorder.request("GET", URL, params={"yhdabh": "0110000000001", "fxny": this_year - 1})
+
+    recorded = asyncio.run(_record())
+    assert inner.calls == 1
+    assert len(list(tmp_path.iterdir())) == 1
+    # 录制的文件已脱敏
+    assert "0110000000001" not in next(tmp_path.iterdir()).read_text(encoding="utf-8")
+
+    async def _replay():
+        replay = ReplayTransport(str(tmp_path))
+        # 不同户号的同一请求回放同一个响应
+        return await replay.request("GET", URL, params={"yhdabh": "0110000000002", "fxny": this_year - 1})
+
+    replayed = asyncio.run(_replay())
+    assert inner.calls == 1
+    assert replayed.status == recorded.status
+    assert replayed.json()["data"]["df"] == recorded.json()["data"]["df"]
+    assert replayed.json()["data"]["yhdabh"] != "0110000000001"
+
+
+def test_cassette_name_follows_relative_year(tmp_path):
+    from custom_components.impc_energy.transport import _cassette_name
+
+    recorded_on = datetime.date(2025, 6, 1)
+    replayed_on = datetime.date(2027, 6, 1)
+
+    # 录制时的"去年"在两年后回放时仍对应"去年"
+    assert (_cassette_name("GET", URL, {"fxny": 2024}, None, recorded_on)
+            == _cassette_name("GET", URL, {"fxny": 2026}, None, replayed_on))
+    assert (_cassette_name("GET", URL, {"fxny": 2024}, None, recorded_on)
+            != _cassette_name("GET", URL, {"fxny": 2025}, None, recorded_on))
+    # 请求的天数不影响文件名
+    assert (_cassette_name("GET", URL, {"ts": 30}, None, recorded_on)
+            == _cassette_name("GET", URL, {"ts": 3}, None, recorded_on))